@@ -0,0 +1,102 @@
+"""Measures the storage and CPU trade-offs of DRAMATIQ_TASKS_COMPRESSION.
+
+Usage:
+
+    python -m benchmarks.compression [--sizes 512 4096 65536] [--repeat 200] [--json]
+
+For each payload size and algorithm, this reports the stored size as a
+fraction of the raw encoded message, along with the average time it
+takes to compress and decompress a payload.
+"""
+
+import argparse
+import json
+import random
+import string
+import sys
+import time
+
+from dramatiq import Message
+
+from django_dramatiq.compression import compress, decompress
+
+ALGORITHMS = [
+    (None, None),
+    ("zlib", 1),
+    ("zlib", 6),
+    ("zlib", 9),
+    ("lzma", 0),
+    ("lzma", 6),
+]
+
+
+def make_message(size):
+    # Mimic realistic kwargs: some repetitive structure plus random text.
+    rand = random.Random(size)
+    items, total = [], 0
+    while total < size:
+        text = "".join(rand.choices(string.ascii_letters + string.digits + " ", k=rand.randint(8, 64)))
+        items.append({"id": len(items), "name": text, "active": rand.random() > 0.5})
+        total += len(text) + 40
+
+    return Message(queue_name="default", actor_name="process_items", args=(), kwargs={"items": items}, options={})
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        data = make_message(size).encode()
+        for algorithm, level in ALGORITHMS:
+            compressed = compress(data, algorithm=algorithm, threshold=0, level=level)
+            results.append(
+                {
+                    "size": len(data),
+                    "algorithm": algorithm or "none",
+                    "level": level,
+                    "stored_size": len(compressed),
+                    "ratio": len(compressed) / len(data),
+                    "compress_us": timeit(
+                        lambda data=data, algorithm=algorithm, level=level: compress(
+                            data, algorithm=algorithm, threshold=0, level=level
+                        ),
+                        repeat,
+                    )
+                    * 1e6,
+                    "decompress_us": timeit(lambda compressed=compressed: decompress(compressed), repeat) * 1e6,
+                }
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="*", type=int, default=[512, 4096, 65536, 1048576])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    header = f"{'size':>10} {'algorithm':>9} {'level':>5} {'stored':>10} {'ratio':>6} {'comp µs':>10} {'decomp µs':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['size']:>10} {r['algorithm']:>9} {r['level'] if r['level'] is not None else '-':>5} "
+            f"{r['stored_size']:>10} {r['ratio']:>6.2f} {r['compress_us']:>10.1f} {r['decompress_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Measures the per-message overhead of the django_dramatiq middleware.
+
+Usage:
+
+    python -m benchmarks.middleware [--messages 1000] [--threads 1 8] [--sizes 64 4096] [--json]
+
+Messages are sent through a StubBroker to a no-op actor, once per
+combination of middleware, worker thread count and payload size.  This
+reports throughput in messages per second, the average time it takes
+to enqueue a message, and the p50, p95 and p99 time it takes a worker
+to process a message, middleware included.
+
+Tasks are stored in a test database created from the Django settings
+in DJANGO_SETTINGS_MODULE (tests.settings, which uses SQLite, by
+default).  Point it at settings using PostgreSQL to benchmark that.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import django
+
+CONFIGURATIONS = {
+    "none": [],
+    "admin": ["django_dramatiq.middleware.AdminMiddleware"],
+    "db_connections": ["django_dramatiq.middleware.DbConnectionsMiddleware"],
+    "admin+db_connections": [
+        "django_dramatiq.middleware.AdminMiddleware",
+        "django_dramatiq.middleware.DbConnectionsMiddleware",
+    ],
+}
+
+
+def make_recorder():
+    from dramatiq import Middleware
+
+    class Recorder(Middleware):
+        """Records how long each message took to process, from the
+        first middleware's before_process_message to the last one's
+        after_process_message.  It must be the first middleware, since
+        after hooks run in reverse order.
+        """
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.started_at = {}
+            self.latencies = []
+            self.done = threading.Event()
+            self.expected = 0
+
+        def before_process_message(self, broker, message):
+            self.started_at[message.message_id] = time.perf_counter()
+
+        def after_process_message(self, broker, message, *, result=None, exception=None):
+            latency = time.perf_counter() - self.started_at.pop(message.message_id)
+            with self.lock:
+                self.latencies.append(latency)
+                if len(self.latencies) >= self.expected:
+                    self.done.set()
+
+    return Recorder()
+
+
+def get_percentiles(values, percentiles=(50, 95, 99)):
+    from django_dramatiq.stats import get_percentiles
+
+    return dict(zip((f"p{percentile}" for percentile in percentiles), get_percentiles(values, percentiles)))
+
+
+def run_one(middleware_paths, threads, size, messages):
+    import dramatiq
+    from dramatiq import Worker
+    from dramatiq.brokers.stub import StubBroker
+
+    from django_dramatiq.models import Task
+    from django_dramatiq.utils import load_middleware
+
+    recorder = make_recorder()
+    recorder.expected = messages
+    broker = StubBroker(middleware=[recorder, *(load_middleware(path) for path in middleware_paths)])
+    broker.emit_after("process_boot")
+
+    def noop(payload):
+        pass
+
+    actor = dramatiq.actor(noop, actor_name="noop", broker=broker)
+    worker = Worker(broker, worker_threads=threads, worker_timeout=10)
+    payload = "x" * size
+    try:
+        start = time.perf_counter()
+        for _ in range(messages):
+            actor.send(payload)
+        enqueue_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        worker.start()
+        recorder.done.wait()
+        duration = time.perf_counter() - start
+    finally:
+        worker.stop()
+        broker.emit_before("worker_shutdown", worker)
+        broker.close()
+        Task.tasks.all().delete()
+
+    return {
+        "messages": messages,
+        "messages_per_second": messages / duration,
+        "enqueue_us": enqueue_duration / messages * 1e6,
+        "latency_ms": {key: value * 1e3 for key, value in get_percentiles(recorder.latencies).items()},
+    }
+
+
+def run(configurations, threads, sizes, messages):
+    from django.db import connection
+
+    results = []
+    for name in configurations:
+        for thread_count in threads:
+            for size in sizes:
+                result = run_one(CONFIGURATIONS[name], thread_count, size, messages)
+                results.append(
+                    {
+                        "middleware": name,
+                        "threads": thread_count,
+                        "size": size,
+                        "database": connection.vendor,
+                        **result,
+                    }
+                )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000, help="The number of messages per run")
+    parser.add_argument("--threads", nargs="*", type=int, default=[1, 8])
+    parser.add_argument("--sizes", nargs="*", type=int, default=[64, 4096], help="Payload sizes, in bytes")
+    parser.add_argument("--middleware", nargs="*", choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = run(args.middleware, args.threads, args.sizes, args.messages)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    header = f"{'middleware':>20} {'threads':>7} {'size':>7} {'msg/s':>9} {'enq µs':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        latency = r["latency_ms"]
+        print(
+            f"{r['middleware']:>20} {r['threads']:>7} {r['size']:>7} {r['messages_per_second']:>9.0f} "
+            f"{r['enqueue_us']:>8.1f} {latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
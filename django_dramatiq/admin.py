@@ -1,13 +1,91 @@
 import json
-from datetime import datetime, timezone
+import uuid
+from datetime import timedelta
 
-from django.conf import settings
+import django
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import F, Max, Q, Sum
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.dateparse import parse_datetime
+from django.utils.html import format_html
+from django.utils.http import urlencode, urlsafe_base64_decode, urlsafe_base64_encode
 from django.utils.safestring import mark_safe
+from django.utils.timezone import now
 from django_dramatiq.apps import DjangoDramatiqConfig
 from dramatiq.encoder import JSONEncoder
 
-from .models import Task
+from .models import Task, TaskFailure, TaskStats, get_message_eta
+from .paginator import EstimatedCountPaginator
+from .stats import get_percentiles
+
+
+#: The query string parameter holding the position of a keyset-paginated page.
+CURSOR_VAR = "cursor"
+
+
+class TaskChangeList(ChangeList):
+    def get_queryset(self, request, *args, **kwargs):
+        # Message payloads and tracebacks can be large and are only
+        # needed by the detail view, so don't load them in the changelist.
+        return super().get_queryset(request, *args, **kwargs).defer("message_data", "traceback")
+
+    def get_filters_params(self, *args, **kwargs):
+        lookup_params = super().get_filters_params(*args, **kwargs)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Cursors are only valid for the filters and ordering they were created with.
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def get_results(self, request):
+        # Keyset pagination relies on the default ordering by
+        # (updated_at, id), so it's turned off when sorting by a column.
+        self.keyset_pagination = self.model_admin.keyset_pagination and ORDER_VAR not in self.params
+        if not self.keyset_pagination:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            updated_at, task_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=task_id))
+
+        result_list = list(queryset.order_by("-updated_at", "-id")[: self.list_per_page + 1])
+        has_next_page = len(result_list) > self.list_per_page
+        result_list = result_list[: self.list_per_page]
+
+        self.first_page_url = cursor and self.get_query_string()
+        self.next_page_url = has_next_page and self.get_query_string({CURSOR_VAR: self.encode_cursor(result_list[-1])})
+        self.page_num = 1
+        self.result_count = len(result_list)
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(cursor) or has_next_page
+        self.paginator = self.model_admin.get_paginator(request, result_list, self.list_per_page)
+
+    @staticmethod
+    def encode_cursor(task):
+        return urlsafe_base64_encode(f"{task.updated_at.isoformat()}|{task.id}".encode())
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            updated_at, task_id = urlsafe_base64_decode(cursor).decode().split("|")
+            updated_at, task_id = parse_datetime(updated_at), uuid.UUID(task_id)
+        except ValueError as e:
+            raise IncorrectLookupParameters(f"Invalid cursor: {cursor!r}.") from e
+
+        # parse_datetime() returns None for strings that aren't dates.
+        if updated_at is None:
+            raise IncorrectLookupParameters(f"Invalid cursor: {cursor!r}.")
+        return updated_at, task_id
 
 
 @admin.register(Task)
@@ -19,25 +97,51 @@ class TaskAdmin(admin.ModelAdmin):
         "status",
         "queue_name",
         "actor_name",
+        "eta",
+        "retries",
+        "failure_reason",
     )
     list_display = (
-        "__str__",
+        "id",
+        "actor_name",
         "status",
         "eta",
+        "retries",
         "created_at",
         "updated_at",
         "queue_name",
-        "actor_name",
+        "failure_reason",
     )
-    list_filter = ("status", "created_at", "queue_name", "actor_name")
+    list_filter = ("status", "created_at", "eta", "queue_name", "actor_name")
     search_fields = ("actor_name",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    def eta(self, instance):
-        timestamp = instance.message.options.get("eta", instance.message.message_timestamp) / 1000
+    #: When set, the changelist seeks pages on (updated_at, id) instead
+    #: of using OFFSET, so that deep pages are as cheap as the first
+    #: one.  Pages are then navigated with "Next page" links only.
+    keyset_pagination = False
+
+    def get_changelist(self, request, **kwargs):
+        return TaskChangeList
+
+    def lookup_allowed(self, lookup, value, request=None):
+        # Used by the links from the TaskFailure admin.
+        if lookup == "traceback_fingerprint":
+            return True
 
-        # Django expects a timezone-aware datetime if USE_TZ is True, and a naive datetime in localtime otherwise.
-        tz = timezone.utc if settings.USE_TZ else None
-        return datetime.fromtimestamp(timestamp, tz=tz)
+        # Django 4.2 doesn't pass the request along.
+        if django.VERSION < (5, 0):
+            return super().lookup_allowed(lookup, value)
+        return super().lookup_allowed(lookup, value, request)
+
+    @admin.display(ordering="eta")
+    def eta(self, instance):
+        # Tasks stored by older versions don't have their eta
+        # denormalized.  Don't load their payload just for this.
+        if instance.eta is None and "message_data" not in instance.get_deferred_fields():
+            return get_message_eta(instance.message)
+        return instance.eta
 
     def message_details(self, instance):
         message_dict = instance.message._asdict()
@@ -55,7 +159,7 @@ class TaskAdmin(admin.ModelAdmin):
         return mark_safe(f"<pre>{message_details}</pre>")
 
     def traceback(self, instance):
-        traceback = instance.message.options.get("traceback", None)
+        traceback = instance.get_traceback()
         if traceback:
             return mark_safe(f"<pre>{traceback}</pre>")
         return None
@@ -68,3 +172,167 @@ class TaskAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, task=None):
         return False
+
+
+@admin.register(TaskFailure)
+class TaskFailureAdmin(admin.ModelAdmin):
+    readonly_fields = (
+        "exception_type",
+        "actor_name",
+        "count",
+        "first_seen",
+        "last_seen",
+        "failure_reason",
+        "fingerprint",
+        "sample_task",
+        "tasks",
+        "traceback",
+    )
+    list_display = (
+        "exception_type",
+        "actor_name",
+        "count",
+        "first_seen",
+        "last_seen",
+        "failure_reason",
+        "sample_task",
+        "tasks",
+    )
+    list_filter = ("last_seen", "actor_name")
+    search_fields = ("exception_type", "actor_name", "failure_reason")
+
+    @admin.display(description="Sample task")
+    def sample_task(self, instance):
+        url = reverse("admin:django_dramatiq_task_change", args=[instance.sample_message_id])
+        return format_html('<a href="{}">{}</a>', url, instance.sample_message_id)
+
+    def tasks(self, instance):
+        url = reverse("admin:django_dramatiq_task_changelist")
+        return format_html(
+            '<a href="{}?{}">Failed tasks</a>', url, urlencode({"traceback_fingerprint": instance.fingerprint})
+        )
+
+    def traceback(self, instance):
+        traceback = (
+            Task.tasks.filter(traceback_fingerprint=instance.fingerprint, traceback__isnull=False)
+            .values_list("traceback", flat=True)
+            .first()
+        )
+        if traceback:
+            return format_html("<pre>{}</pre>", traceback)
+        return None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, failure=None):
+        return False
+
+
+@admin.register(TaskStats)
+class TaskStatsAdmin(admin.ModelAdmin):
+    change_list_template = "admin/django_dramatiq/taskstats/change_list.html"
+    list_display = ("bucket", "actor_name", "queue_name", "status", "count", "total_duration", "max_duration")
+    list_filter = ("bucket", "status", "queue_name", "actor_name")
+    date_hierarchy = "bucket"
+
+    #: The periods, in hours, the dashboard can summarize.
+    dashboard_periods = (1, 6, 24, 24 * 7)
+
+    #: The max number of recently finished Tasks that latency and
+    #: runtime percentiles are computed from.
+    dashboard_timings_sample_size = 10000
+
+    def get_urls(self):
+        return [
+            path(
+                "dashboard/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="django_dramatiq_taskstats_dashboard",
+            ),
+            *super().get_urls(),
+        ]
+
+    def dashboard_view(self, request):
+        """Summarize the stats of the last few hours per actor and
+        queue, along with latency and runtime percentiles per actor.
+        """
+        try:
+            hours = int(request.GET.get("hours", self.dashboard_periods[0]))
+        except ValueError:
+            hours = self.dashboard_periods[0]
+
+        since = now() - timedelta(hours=hours)
+        rows = {}
+        queryset = (
+            TaskStats.stats.filter(bucket__gte=since)
+            .values("actor_name", "queue_name", "status")
+            .annotate(count=Sum("count"), total_duration=Sum("total_duration"), max_duration=Max("max_duration"))
+            .order_by()
+        )
+        for stats in queryset:
+            row = rows.setdefault(
+                (stats["actor_name"], stats["queue_name"]),
+                {
+                    "actor_name": stats["actor_name"],
+                    "queue_name": stats["queue_name"],
+                    "counts": dict.fromkeys(
+                        [status for status, _ in Task.STATUSES if status != Task.STATUS_RUNNING], 0
+                    ),
+                    "total_duration": 0,
+                    "max_duration": None,
+                },
+            )
+            row["counts"][stats["status"]] = stats["count"]
+            row["total_duration"] += stats["total_duration"]
+            if stats["max_duration"] is not None:
+                row["max_duration"] = max(row["max_duration"] or 0, stats["max_duration"])
+
+        for row in rows.values():
+            counts = row["counts"]
+            finished = counts[Task.STATUS_DONE] + counts[Task.STATUS_FAILED]
+            row["failure_rate"] = counts[Task.STATUS_FAILED] / finished if finished else None
+            row["avg_duration"] = row["total_duration"] / finished if finished else None
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Task dashboard",
+            "hours": hours,
+            "periods": self.dashboard_periods,
+            "statuses": [label for status, label in Task.STATUSES if status != Task.STATUS_RUNNING],
+            "rows": sorted(rows.values(), key=lambda row: (row["actor_name"], row["queue_name"])),
+            "timings": self.get_dashboard_timings(since),
+        }
+        return TemplateResponse(request, "admin/django_dramatiq/taskstats/dashboard.html", context)
+
+    def get_dashboard_timings(self, since):
+        samples = {}
+        queryset = (
+            Task.tasks.filter(finished_at__gte=since, enqueued_at__isnull=False, started_at__isnull=False)
+            # Tasks written before their retry's start cleared the
+            # previous attempt's finish time.
+            .filter(finished_at__gte=F("started_at"))
+            .order_by("-finished_at")
+            .only("actor_name", "eta", "enqueued_at", "started_at", "finished_at")
+        )
+        for task in queryset[: self.dashboard_timings_sample_size]:
+            latencies, runtimes = samples.setdefault(task.actor_name, ([], []))
+            latencies.append(task.latency.total_seconds())
+            runtimes.append(task.runtime.total_seconds())
+
+        return [
+            {
+                "actor_name": actor_name,
+                "count": len(latencies),
+                "latency": get_percentiles(latencies),
+                "runtime": get_percentiles(runtimes),
+            }
+            for actor_name, (latencies, runtimes) in sorted(samples.items(), key=lambda item: item[0] or "")
+        ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, stats=None):
+        return False
@@ -109,10 +109,54 @@ class DjangoDramatiqConfig(AppConfig):
     def rate_limiter_backend_settings(cls):
         return getattr(settings, "DRAMATIQ_RATE_LIMITER_BACKEND", {})
 
+    @classmethod
+    def outbox_settings(cls):
+        return getattr(settings, "DRAMATIQ_OUTBOX", {})
+
+    @classmethod
+    def db_pool_settings(cls):
+        return getattr(settings, "DRAMATIQ_DB_POOL", {})
+
     @classmethod
     def tasks_database(cls):
         return getattr(settings, "DRAMATIQ_TASKS_DATABASE", "default")
 
+    @classmethod
+    def tasks_backend_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_BACKEND", {})
+
+    @classmethod
+    def tasks_recent_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_RECENT", {})
+
+    @classmethod
+    def tasks_retention_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_RETENTION", {})
+
+    @classmethod
+    def tasks_partitioning_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_PARTITIONING", {})
+
+    @classmethod
+    def tasks_tracking_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_TRACKING", {})
+
+    @classmethod
+    def tasks_stats_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_STATS", {})
+
+    @classmethod
+    def tasks_tracebacks_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_TRACEBACKS", {})
+
+    @classmethod
+    def tasks_compression_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_COMPRESSION", {})
+
+    @classmethod
+    def tasks_buffer_settings(cls):
+        return getattr(settings, "DRAMATIQ_TASKS_BUFFER", {})
+
     @classmethod
     def select_encoder(cls):
         encoder = getattr(settings, "DRAMATIQ_ENCODER", DEFAULT_ENCODER)
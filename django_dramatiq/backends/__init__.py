@@ -0,0 +1,20 @@
+from django.utils.module_loading import import_string
+
+from ..apps import DjangoDramatiqConfig
+from .base import TaskBackend
+from .log import LogFileBackend
+from .memory import MemoryBackend
+from .orm import ORMBackend
+
+__all__ = ["LogFileBackend", "MemoryBackend", "ORMBackend", "TaskBackend", "load_backend"]
+
+DEFAULT_BACKEND = "django_dramatiq.backends.ORMBackend"
+
+
+def load_backend():
+    """Instantiate the backend configured by the
+    ``DRAMATIQ_TASKS_BACKEND`` setting.
+    """
+    backend_settings = DjangoDramatiqConfig.tasks_backend_settings()
+    backend_class = import_string(backend_settings.get("BACKEND", DEFAULT_BACKEND))
+    return backend_class(**backend_settings.get("BACKEND_OPTIONS", {}))
@@ -0,0 +1,40 @@
+class TaskBackend:
+    """Base class for the backends that store the Tasks tracked by
+    `AdminMiddleware`.
+
+    Subclasses must implement `create_or_update_from_message` and
+    `update_status_from_message`.  The bulk methods call them once per
+    update unless they're overridden.  Failures are only aggregated by
+    backends that override `record_failure`.
+    """
+
+    def create_or_update_from_message(self, message, **extra_fields):  # pragma: no cover
+        """Store the Task for `message`, creating it if it doesn't
+        exist and setting `extra_fields` on it.
+        """
+        raise NotImplementedError
+
+    def update_status_from_message(self, message, status, **extra_fields):  # pragma: no cover
+        """Set the status of the Task for `message`.  The Task is
+        created from `message` and `extra_fields` if it doesn't exist.
+        """
+        raise NotImplementedError
+
+    def bulk_create_or_update_from_messages(self, updates):
+        """Like `create_or_update_from_message`, but for a batch of
+        ``(message, extra_fields)`` pairs.
+        """
+        for message, extra_fields in updates:
+            self.create_or_update_from_message(message, **extra_fields)
+
+    def bulk_update_status_from_messages(self, updates):
+        """Like `update_status_from_message`, but for a batch of
+        ``(message, extra_fields)`` pairs.
+        """
+        for message, extra_fields in updates:
+            self.update_status_from_message(message, **extra_fields)
+
+    def record_failure(self, message, fingerprint, *, count=1, **fields):
+        """Count `count` failures, the last of which was `message`'s,
+        in the aggregate for `fingerprint`.
+        """
@@ -0,0 +1,55 @@
+import base64
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.timezone import now
+
+from .base import TaskBackend
+
+
+class LogFileBackend(TaskBackend):
+    """Appends every Task update to a file as a line of JSON, keeping
+    the tracking write path off the database entirely.  The file is
+    never read back, so it's up to you to ship or rotate it.
+
+    Updates that create or rewrite a Task include its encoded message,
+    base64-encoded, under ``message_data``.  Status updates don't.
+
+    Parameters:
+      path(str): The file to append updates to.
+    """
+
+    def __init__(self, *, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def create_or_update_from_message(self, message, **extra_fields):
+        self._write([self._make_record(message, extra_fields, with_message_data=True)])
+
+    def update_status_from_message(self, message, status, **extra_fields):
+        self._write([self._make_record(message, {**extra_fields, "status": status}, with_message_data=False)])
+
+    def bulk_create_or_update_from_messages(self, updates):
+        self._write(
+            [self._make_record(message, extra_fields, with_message_data=True) for message, extra_fields in updates]
+        )
+
+    def bulk_update_status_from_messages(self, updates):
+        self._write(
+            [self._make_record(message, extra_fields, with_message_data=False) for message, extra_fields in updates]
+        )
+
+    def _make_record(self, message, extra_fields, *, with_message_data):
+        record = {"id": message.message_id, "updated_at": now(), **extra_fields}
+        if with_message_data:
+            record["message_data"] = base64.b64encode(message.encode()).decode("ascii")
+        return record
+
+    def _write(self, records):
+        if not records:
+            return
+
+        lines = "".join(json.dumps(record, cls=DjangoJSONEncoder) + "\n" for record in records)
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
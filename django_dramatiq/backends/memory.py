@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+from django.utils.timezone import now
+
+from .base import TaskBackend
+
+#: The default number of Tasks kept in memory.
+DEFAULT_MAX_SIZE = 10000
+
+
+class MemoryBackend(TaskBackend):
+    """Keeps the most recently updated Tasks in memory, evicting the
+    least recently updated ones once `max_size` is reached.  Nothing
+    is shared between processes, which makes this backend mostly
+    useful in tests and for local development.
+
+    Tasks are stored as dicts holding the message and the fields set
+    on it, and can be looked up by message id with `get`.
+
+    Parameters:
+      max_size(int): The max number of Tasks to keep.
+    """
+
+    def __init__(self, *, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.tasks = OrderedDict()
+
+    def create_or_update_from_message(self, message, **extra_fields):
+        with self.lock:
+            task = self.tasks.pop(message.message_id, {"id": message.message_id})
+            task.update(extra_fields, message=message, updated_at=now())
+            self._store(task)
+
+    def update_status_from_message(self, message, status, **extra_fields):
+        with self.lock:
+            task = self.tasks.pop(message.message_id, None)
+            if task is None:
+                task = {"id": message.message_id, "message": message, **extra_fields}
+            task.update(extra_fields, status=status, updated_at=now())
+            self._store(task)
+
+    def get(self, message_id):
+        """Get the Task for `message_id`, or None if it isn't stored."""
+        with self.lock:
+            return self.tasks.get(message_id)
+
+    def clear(self):
+        with self.lock:
+            self.tasks.clear()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def _store(self, task):
+        self.tasks[task["id"]] = task
+        while len(self.tasks) > self.max_size:
+            self.tasks.popitem(last=False)
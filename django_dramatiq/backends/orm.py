@@ -0,0 +1,33 @@
+from .base import TaskBackend
+
+
+class ORMBackend(TaskBackend):
+    """Stores Tasks in the ``DRAMATIQ_TASKS_DATABASE`` database using
+    the `Task` model.  This is the default backend, and the only one
+    the admin can display.
+    """
+
+    def create_or_update_from_message(self, message, **extra_fields):
+        from ..models import Task
+
+        return Task.tasks.create_or_update_from_message(message, **extra_fields)
+
+    def update_status_from_message(self, message, status, **extra_fields):
+        from ..models import Task
+
+        Task.tasks.update_status_from_message(message, status, **extra_fields)
+
+    def bulk_create_or_update_from_messages(self, updates):
+        from ..models import Task
+
+        return Task.tasks.bulk_create_or_update_from_messages(updates)
+
+    def bulk_update_status_from_messages(self, updates):
+        from ..models import Task
+
+        Task.tasks.bulk_update_status_from_messages(updates)
+
+    def record_failure(self, message, fingerprint, *, count=1, **fields):
+        from ..models import TaskFailure
+
+        TaskFailure.failures.record_failure(fingerprint, message_id=message.message_id, count=count, **fields)
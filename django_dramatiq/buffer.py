@@ -0,0 +1,210 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django import db
+
+LOGGER = logging.getLogger("django_dramatiq.TaskBuffer")
+
+#: The default number of pending messages that triggers a flush.
+DEFAULT_MAX_SIZE = 500
+
+#: The default number of seconds between flushes.
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+#: The default number of seconds a message in a non-final status is
+#: held back so that later updates can be coalesced into it.
+DEFAULT_COALESCE_WINDOW = 0.5
+
+
+class _PendingUpdate:
+    __slots__ = ("added_at", "extra_fields", "message", "precedence", "status_only")
+
+    def __init__(self, message, extra_fields, precedence, added_at, status_only):
+        self.message = message
+        self.extra_fields = extra_fields
+        self.precedence = precedence
+        self.added_at = added_at
+        self.status_only = status_only
+
+
+class TaskBuffer:
+    """Collects Task updates in memory and writes them to the database
+    in batches from a background thread.
+
+    Updates are coalesced per message so that only the latest state of
+    each message gets written, along with the fields set by earlier
+    updates.  An update never replaces one that is
+    further along in the message's lifecycle (eg. a late ``running``
+    update can't overwrite ``done``), unless the message has since been
+    retried.  Messages in a non-final status are held back for up to
+    `coalesce_window` seconds so that short-lived messages are written
+    once, with their final status.
+
+    Writes are also ordered in the database, so that updates flushed
+    late by another process's buffer can't overwrite newer ones.
+
+    Failures are aggregated per fingerprint, and each aggregate is
+    written once per flush.
+
+    A flush happens whenever `max_size` messages are pending or every
+    `flush_interval` seconds, whichever comes first.
+
+    Parameters:
+      backend(TaskBackend): The backend to write updates to.  Defaults
+        to the ORM backend.
+      max_size(int): The number of pending messages that triggers a flush.
+      flush_interval(float): The max number of seconds between flushes.
+      coalesce_window(float): The number of seconds to hold back
+        messages in a non-final status for.
+    """
+
+    def __init__(
+        self,
+        *,
+        backend=None,
+        max_size=DEFAULT_MAX_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        coalesce_window=DEFAULT_COALESCE_WINDOW,
+    ):
+        if backend is None:
+            from .backends import ORMBackend
+
+            backend = ORMBackend()
+
+        self.backend = backend
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.coalesce_window = coalesce_window
+
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.failures = {}
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, message, *, status_only=False, **extra_fields):
+        """Schedule an update of the Task for `message`.  Returns
+        False if the update was discarded because a more recent one
+        is already pending.
+
+        When `status_only` is set, existing Tasks won't have their
+        message data rewritten, unless another update to the same
+        message requires it.
+        """
+        from .models import Task
+
+        # Middleware that run later, like Retries, may still change the
+        # message's options, so the update keeps them as they are now.
+        message = message.copy()
+        precedence = Task.get_precedence(message.options.get("retries", 0), extra_fields.get("status"))
+
+        with self.lock:
+            self._ensure_thread()
+            update = self.pending.get(message.message_id)
+            if update is None:
+                update = _PendingUpdate(message, extra_fields, precedence, time.monotonic(), status_only)
+                self.pending[message.message_id] = update
+                if len(self.pending) >= self.max_size:
+                    self.wakeup.set()
+                return True
+
+            update.status_only = update.status_only and status_only
+            if precedence < update.precedence:
+                LOGGER.debug("Discarding stale update for message %r.", message.message_id)
+                return False
+
+            update.message = message
+            update.extra_fields = {**update.extra_fields, **extra_fields}
+            update.precedence = precedence
+            return True
+
+    def add_failure(self, message, fingerprint, **fields):
+        """Schedule counting a failure of `message` in the aggregate for
+        `fingerprint`.  `fields` are those of the latest failure.
+        """
+        with self.lock:
+            self._ensure_thread()
+            count = self.failures.get(fingerprint, (None, None, 0))[2]
+            self.failures[fingerprint] = (message, fields, count + 1)
+
+    def flush(self, *, force=True):
+        """Write pending updates to the database.  Unless `force` is
+        set, messages in a non-final status that were added less than
+        `coalesce_window` seconds ago are kept for the next flush.
+        """
+        from .models import Task
+
+        with self.lock:
+            failures, self.failures = self.failures, {}
+            if force:
+                updates, self.pending = list(self.pending.values()), {}
+            else:
+                updates, deadline = [], time.monotonic() - self.coalesce_window
+                for message_id, update in list(self.pending.items()):
+                    if update.precedence[1] == Task.FINAL_STATUS_RANK or update.added_at <= deadline:
+                        updates.append(self.pending.pop(message_id))
+
+        for fingerprint, (message, fields, count) in failures.items():
+            try:
+                self.backend.record_failure(message, fingerprint, count=count, **fields)
+            except Exception:
+                LOGGER.exception("Failed to record %d failures with fingerprint %r.", count, fingerprint)
+
+        if not updates:
+            return
+
+        LOGGER.debug("Flushing %d Task updates.", len(updates))
+        try:
+            self.backend.bulk_create_or_update_from_messages(
+                (update.message, update.extra_fields) for update in updates if not update.status_only
+            )
+            self.backend.bulk_update_status_from_messages(
+                (update.message, update.extra_fields) for update in updates if update.status_only
+            )
+        except Exception:
+            LOGGER.exception("Failed to flush %d Task updates.", len(updates))
+
+    def close(self):
+        """Stop the background thread and flush any pending updates."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+
+        if thread is not None and self.pid == os.getpid():
+            self.stopping.set()
+            self.wakeup.set()
+            thread.join()
+            self.stopping.clear()
+
+        self.flush()
+
+    def _ensure_thread(self):
+        # The buffer may be inherited by a forked process, in which
+        # case the flusher thread has to be started again.
+        if self.thread is not None and self.pid == os.getpid():
+            return
+
+        if self.pid is None:
+            atexit.register(self.close)
+
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name="django_dramatiq.TaskBuffer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopping.is_set():
+                self.wakeup.wait(self.flush_interval)
+                self.wakeup.clear()
+                db.close_old_connections()
+                # Memory pressure takes priority over coalescing.
+                self.flush(force=len(self.pending) >= self.max_size)
+                # Pooled connections go back to the pool instead of being
+                # held until the next flush.
+                db.close_old_connections()
+        finally:
+            db.connections.close_all()
@@ -0,0 +1,76 @@
+"""Helpers for enqueueing many messages at once.
+
+While messages are enqueued in bulk, `AdminMiddleware` collects the
+Tasks it would create instead of writing them one at a time, and they
+are written with a single bulk upsert per batch.  Workers may already
+have run some of the messages by then, so the upsert leaves alone the
+Tasks that they moved further along.
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from itertools import islice
+
+import dramatiq
+
+LOGGER = logging.getLogger("django_dramatiq.bulk")
+
+#: The default number of messages whose Tasks are written per query.
+DEFAULT_BATCH_SIZE = 1000
+
+#: The Task updates deferred while in `defer_task_writes`, as a dict
+#: of ``(message, extra_fields)`` lists keyed by their middleware.
+deferred_task_writes = contextvars.ContextVar("deferred_task_writes", default=None)
+
+
+@contextmanager
+def defer_task_writes():
+    """Collect the Tasks `AdminMiddleware` stores for the messages
+    enqueued within this block, and write them in bulk when it exits.
+    Like the writes made while enqueueing, failing to write them is
+    logged rather than raised.
+    """
+    if deferred_task_writes.get() is not None:
+        yield
+        return
+
+    deferred = {}
+    token = deferred_task_writes.set(deferred)
+    try:
+        yield
+    finally:
+        # Messages enqueued before an error was raised were still sent,
+        # so their Tasks are written regardless.
+        deferred_task_writes.reset(token)
+        for middleware, updates in deferred.items():
+            try:
+                middleware.backend.bulk_create_or_update_from_messages(updates)
+            except Exception:
+                LOGGER.exception("Failed to write %d Tasks.", len(updates))
+
+
+def send_many(messages, *, delay=None, broker=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Enqueue `messages`, writing the Tasks for every `batch_size` of
+    them in bulk.
+
+    Parameters:
+      messages(iterable[Message]): The messages to enqueue, for
+        example ``(send_email.message(user.pk) for user in users)``.
+      delay(int): The minimum amount of time, in milliseconds, each
+        message should be delayed by.
+      broker(Broker): The broker to enqueue the messages on.  Defaults
+        to the global broker.
+      batch_size(int): The number of messages to enqueue per batch.
+
+    Returns:
+      list[Message]: The enqueued messages.
+    """
+    broker = broker or dramatiq.get_broker()
+    messages = iter(messages)
+    enqueued = []
+    while batch := list(islice(messages, batch_size)):
+        with defer_task_writes():
+            for message in batch:
+                enqueued.append(broker.enqueue(message, delay=delay))
+    return enqueued
@@ -0,0 +1,46 @@
+import lzma
+import zlib
+
+#: Compressed payloads are prefixed with one of these marker bytes.
+#: Encoded messages never start with them (JSON starts with "{" and
+#: pickle with "\x80"), so uncompressed payloads stored by older
+#: versions can still be told apart.
+ZLIB_MARKER = b"\x01"
+LZMA_MARKER = b"\x02"
+
+#: The default size, in bytes, above which payloads get compressed.
+DEFAULT_THRESHOLD = 1024
+
+ALGORITHMS = {
+    "zlib": (ZLIB_MARKER, lambda data, level: zlib.compress(data, -1 if level is None else level)),
+    "lzma": (LZMA_MARKER, lambda data, level: lzma.compress(data, preset=level)),
+}
+
+
+def compress(data, algorithm=None, threshold=DEFAULT_THRESHOLD, level=None):
+    """Compress `data` with `algorithm` if it's larger than `threshold`
+    bytes.  Data is returned as-is if `algorithm` is None, if it's too
+    small or if compressing it wouldn't make it any smaller.
+    """
+    if algorithm is None or len(data) <= threshold:
+        return data
+
+    try:
+        marker, compress_fn = ALGORITHMS[algorithm]
+    except KeyError:
+        raise ValueError(f"Unsupported compression algorithm: {algorithm!r}.") from None
+
+    compressed = marker + compress_fn(data, level)
+    if len(compressed) >= len(data):
+        return data
+    return compressed
+
+
+def decompress(data):
+    """Decompress `data` according to its marker byte, if any."""
+    marker = data[:1]
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(data[1:])
+    elif marker == LZMA_MARKER:
+        return lzma.decompress(data[1:])
+    return data
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connections
+
+from django_dramatiq.models import DATABASE_LABEL, Task
+from django_dramatiq.partitions import create_partitions, get_partitioning_settings, partition_table
+
+
+class Command(BaseCommand):
+    help = "Manages the partitions of the Dramatiq tasks table (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--setup",
+            action="store_true",
+            help="Convert the existing tasks table into a partitioned table, carrying its rows over",
+        )
+        parser.add_argument(
+            "--premake",
+            type=int,
+            help="The number of partitions to create ahead of time (default: DRAMATIQ_TASKS_PARTITIONING['PREMAKE'])",
+        )
+
+    def handle(self, setup, premake, **options):
+        partitioning = get_partitioning_settings()
+        if not partitioning:
+            raise CommandError("DRAMATIQ_TASKS_PARTITIONING is not configured.")
+
+        connection = connections[DATABASE_LABEL]
+        interval = partitioning["INTERVAL"]
+        count = partitioning["PREMAKE"] if premake is None else premake
+        try:
+            if setup:
+                self.stdout.write(f" * Partitioning {Task._meta.db_table!r} by {interval}...")
+                partition_table(connection, Task, interval=interval, count=count)
+
+            for name in create_partitions(connection, Task, interval=interval, count=count):
+                self.stdout.write(f" * Partition {name!r} is ready.")
+        except NotSupportedError as e:
+            raise CommandError(str(e)) from e
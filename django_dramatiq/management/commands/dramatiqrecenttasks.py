@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_dramatiq.apps import DjangoDramatiqConfig
+from django_dramatiq.recent import read_snapshots
+
+
+class Command(BaseCommand):
+    help = "Lists the tasks recently run by worker processes using the RecentTasksMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="The max number of tasks to list (default: 20)")
+        parser.add_argument("--actor", help="Only list tasks for this actor")
+        parser.add_argument("--status", help="Only list tasks with this status")
+        parser.add_argument("--json", action="store_true", dest="as_json", help="Output the tasks as JSON")
+
+    def handle(self, limit, actor, status, as_json, **options):
+        snapshot_dir = DjangoDramatiqConfig.tasks_recent_settings().get("SNAPSHOT_DIR")
+        if snapshot_dir is None:
+            raise CommandError("DRAMATIQ_TASKS_RECENT['SNAPSHOT_DIR'] is not configured.")
+
+        records = []
+        for snapshot in read_snapshots(snapshot_dir):
+            for record in reversed(snapshot["records"]):
+                if actor is not None and record["actor_name"] != actor:
+                    continue
+                if status is not None and record["status"] != status:
+                    continue
+                records.append({"pid": snapshot["pid"], **record})
+
+        records.sort(key=lambda record: record["finished_at"] or record["started_at"] or 0, reverse=True)
+        records = records[:limit]
+        if as_json:
+            self.stdout.write(json.dumps(records, indent=2))
+            return
+
+        for record in records:
+            finished_at = record["finished_at"] or record["started_at"]
+            duration = ""
+            if record["started_at"] is not None and record["finished_at"] is not None:
+                duration = f" in {record['finished_at'] - record['started_at']:.3f}s"
+            age = f"{time.time() - finished_at:.0f}s ago" if finished_at is not None else "-"
+            line = f"{record['message_id']} {record['actor_name']} [{record['status']}{duration}] {age} (pid {record['pid']})"
+            if record["failure_reason"]:
+                line += f": {record['failure_reason']}"
+            self.stdout.write(line)
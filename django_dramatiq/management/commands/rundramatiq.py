@@ -108,6 +108,12 @@ class Command(BaseCommand):
             default=[],
             help="Fork a subprocess to run the given function",
         )
+        parser.add_argument(
+            "--outbox-relay",
+            action="store_true",
+            dest="outbox_relay",
+            help="Fork a subprocess to relay messages from the outbox",
+        )
         parser.add_argument(
             "--worker-shutdown-timeout",
             type=int,
@@ -129,6 +135,7 @@ class Command(BaseCommand):
         pid_file,
         log_file,
         forks,
+        outbox_relay,
         worker_shutdown_timeout,
         use_spawn,
         **options,
@@ -139,6 +146,9 @@ class Command(BaseCommand):
         if watch_args and use_polling_watcher:
             watch_args.append("--watch-use-polling")
 
+        if outbox_relay:
+            forks = [*forks, "django_dramatiq.outbox:run_relay"]
+
         forks_args = []
         if forks:
             for function in forks:
@@ -1,40 +1,191 @@
 import logging
-import sys
-import traceback
+import threading
+import time
+import zlib
+from collections import deque
 
 from django import db
+from django.utils.timezone import now
+from dramatiq.errors import ActorNotFound
 from dramatiq.middleware import Middleware
 
+from . import bulk, pool, recent, stats, tracebacks
+from .apps import DjangoDramatiqConfig
+from .backends import load_backend
+from .buffer import DEFAULT_COALESCE_WINDOW, DEFAULT_FLUSH_INTERVAL, DEFAULT_MAX_SIZE, TaskBuffer
+
 LOGGER = logging.getLogger("django_dramatiq.AdminMiddleware")
 
 
 class AdminMiddleware(Middleware):
-    """This middleware keeps track of task executions."""
+    """This middleware keeps track of task executions.
+
+    Tasks are stored by the backend configured through
+    ``DRAMATIQ_TASKS_BACKEND``, which defaults to the database.
+
+    When ``DRAMATIQ_TASKS_BUFFER`` is configured, Task updates are
+    buffered in memory, coalesced per message and written in batches by
+    a background thread instead of being written synchronously on the
+    worker thread.
+
+    ``DRAMATIQ_TASKS_TRACKING`` limits which messages are tracked.
+    Actors can be included or excluded by name, and successful messages
+    can be sampled per actor or per queue.  Failed messages, and any
+    message that has been retried, are always tracked.  With
+    ``FAILURES_ONLY``, Tasks are only written once a message fails or
+    is skipped.
+
+    When ``DRAMATIQ_TASKS_STATS`` is configured, every message is also
+    counted in the per-minute `TaskStats` rollups, whether or not it's
+    tracked.
+
+    Tasks for messages enqueued through `django_dramatiq.bulk` are
+    written in bulk once their batch has been enqueued.
+    """
+
+    def __init__(self):
+        self.backend = load_backend()
+        buffer_settings = DjangoDramatiqConfig.tasks_buffer_settings()
+        if buffer_settings:
+            self.buffer = TaskBuffer(
+                backend=self.backend,
+                max_size=buffer_settings.get("MAX_SIZE", DEFAULT_MAX_SIZE),
+                flush_interval=buffer_settings.get("FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL),
+                coalesce_window=buffer_settings.get("COALESCE_WINDOW", DEFAULT_COALESCE_WINDOW),
+            )
+        else:
+            self.buffer = None
+
+        stats_settings = DjangoDramatiqConfig.tasks_stats_settings()
+        if stats_settings:
+            self.stats = stats.StatsCollector(
+                flush_interval=stats_settings.get("FLUSH_INTERVAL", stats.DEFAULT_FLUSH_INTERVAL),
+            )
+        else:
+            self.stats = None
+        self.started = {}
+
+        tracebacks_settings = DjangoDramatiqConfig.tasks_tracebacks_settings()
+        self.traceback_capture = tracebacks.TracebackCapture(
+            enabled=tracebacks_settings.get("ENABLED", True),
+            max_frames=tracebacks_settings.get("MAX_FRAMES", tracebacks.DEFAULT_MAX_FRAMES),
+            max_size=tracebacks_settings.get("MAX_SIZE", tracebacks.DEFAULT_MAX_SIZE),
+            dedup_ttl=tracebacks_settings.get("DEDUP_TTL", tracebacks.DEFAULT_DEDUP_TTL),
+            dedup_cache_size=tracebacks_settings.get("DEDUP_CACHE_SIZE", tracebacks.DEFAULT_DEDUP_CACHE_SIZE),
+        )
+
+        tracking_settings = DjangoDramatiqConfig.tasks_tracking_settings()
+        self.include_actors = set(tracking_settings.get("INCLUDE_ACTORS") or ())
+        self.exclude_actors = set(tracking_settings.get("EXCLUDE_ACTORS") or ())
+        self.sample_rate = tracking_settings.get("SAMPLE_RATE", 1.0)
+        self.actor_sample_rates = tracking_settings.get("ACTOR_SAMPLE_RATES", {})
+        self.queue_sample_rates = tracking_settings.get("QUEUE_SAMPLE_RATES", {})
+        self.failures_only = tracking_settings.get("FAILURES_ONLY", False)
+
+    def _tracks_failures_only(self, message):
+        if isinstance(self.failures_only, bool):
+            return self.failures_only
+        return message.queue_name in self.failures_only
+
+    def _should_track(self, message, *, failed=False):
+        if self.include_actors and message.actor_name not in self.include_actors:
+            return False
+        if message.actor_name in self.exclude_actors:
+            return False
+        if failed or message.options.get("retries", 0):
+            return True
+
+        sample_rate = self.actor_sample_rates.get(
+            message.actor_name,
+            self.queue_sample_rates.get(message.queue_name, self.sample_rate),
+        )
+        if sample_rate >= 1:
+            return True
+
+        # The decision is derived from the message id so that every
+        # update to a message is either tracked or dropped, regardless
+        # of which process makes it.
+        return zlib.crc32(message.message_id.encode()) / 2**32 < sample_rate
+
+    def _create_or_update_task(self, message, *, status_only=False, **extra_fields):
+        if self.buffer is not None:
+            self.buffer.add(message, status_only=status_only, **extra_fields)
+        elif status_only:
+            self.backend.update_status_from_message(message, **extra_fields)
+        else:
+            self.backend.create_or_update_from_message(message, **extra_fields)
+
+    def _record_failure(self, message, exception, fingerprint, failure_reason):
+        exception_type = type(exception)
+        exception_name = exception_type.__qualname__
+        if exception_type.__module__ != "builtins":
+            exception_name = f"{exception_type.__module__}.{exception_name}"
+
+        fields = {
+            "actor_name": message.actor_name,
+            "exception_type": exception_name[:300],
+            "failure_reason": failure_reason,
+        }
+        if self.buffer is not None:
+            self.buffer.add_failure(message, fingerprint, **fields)
+        else:
+            self.backend.record_failure(message, fingerprint, **fields)
+
+    def before_worker_shutdown(self, broker, worker):
+        if self.buffer is not None:
+            self.buffer.close()
+        if self.stats is not None:
+            self.stats.close()
 
     def after_enqueue(self, broker, message, delay):
-        from .models import Task
+        from .models import Task, get_message_eta
 
-        LOGGER.debug("Creating Task from message %r.", message.message_id)
         status = Task.STATUS_ENQUEUED
         if delay:
             status = Task.STATUS_DELAYED
 
-        Task.tasks.create_or_update_from_message(
-            message,
-            status=status,
-            actor_name=message.actor_name,
-            queue_name=message.queue_name,
-        )
+        if self.stats is not None:
+            self.stats.add(message.actor_name, message.queue_name, status)
+        if self._tracks_failures_only(message) or not self._should_track(message):
+            return
+
+        extra_fields = {
+            "status": status,
+            "actor_name": message.actor_name,
+            "queue_name": message.queue_name,
+            "eta": get_message_eta(message),
+            "retries": message.options.get("retries", 0),
+            "enqueued_at": now(),
+            # Clear the timings of any previous attempt.
+            "started_at": None,
+            "finished_at": None,
+        }
+        deferred = bulk.deferred_task_writes.get()
+        if deferred is not None:
+            deferred.setdefault(self, []).append((message, extra_fields))
+            return
+
+        LOGGER.debug("Creating Task from message %r.", message.message_id)
+        self._create_or_update_task(message, **extra_fields)
 
     def before_process_message(self, broker, message):
         from .models import Task
 
+        if self.stats is not None:
+            self.started[message.message_id] = time.monotonic()
+        if self._tracks_failures_only(message) or not self._should_track(message):
+            return
+
         LOGGER.debug("Updating Task from message %r.", message.message_id)
-        Task.tasks.create_or_update_from_message(
+        self._create_or_update_task(
             message,
+            status_only=True,
             status=Task.STATUS_RUNNING,
             actor_name=message.actor_name,
             queue_name=message.queue_name,
+            started_at=now(),
+            # Clear the finish time of any previous attempt.
+            finished_at=None,
         )
 
     def after_skip_message(self, broker, message):
@@ -43,42 +194,208 @@ class AdminMiddleware(Middleware):
         self.after_process_message(broker, message, status=Task.STATUS_SKIPPED)
 
     def after_process_message(self, broker, message, *, result=None, exception=None, status=None):
-        from .models import Task
+        from .models import Task, get_message_eta
 
         if exception is not None:
             status = Task.STATUS_FAILED
-            exc_type, exc_value, exc_traceback = sys.exc_info()
-            formatted_exception = traceback.format_exception(
-                exception,
-                exc_value,
-                exc_traceback,
-                limit=30,
-            )
-            message.options["traceback"] = "".join(formatted_exception)
         elif status is None:
             status = Task.STATUS_DONE
 
+        if self.stats is not None:
+            started_at = self.started.pop(message.message_id, None)
+            duration = None if started_at is None else time.monotonic() - started_at
+            self.stats.add(message.actor_name, message.queue_name, status, duration)
+        if status == Task.STATUS_DONE and self._tracks_failures_only(message):
+            return
+        if not self._should_track(message, failed=exception is not None):
+            return
+
+        extra_fields = {}
+        if exception is not None:
+            fingerprint, formatted_traceback = self.traceback_capture.capture(exception)
+            extra_fields["traceback_fingerprint"] = fingerprint
+            if formatted_traceback is not None:
+                extra_fields["traceback"] = formatted_traceback
+            extra_fields["eta"] = get_message_eta(message)
+            extra_fields["retries"] = message.options.get("retries", 0)
+            extra_fields["failure_reason"] = f"{type(exception).__name__}: {exception}"[:300]
+            self._record_failure(message, exception, fingerprint, extra_fields["failure_reason"])
+
         LOGGER.debug("Updating Task from message %r.", message.message_id)
-        Task.tasks.create_or_update_from_message(
+        self._create_or_update_task(
             message,
+            # Status updates don't write the fields set on failure.
+            status_only=exception is None,
             status=status,
             actor_name=message.actor_name,
             queue_name=message.queue_name,
+            finished_at=now(),
+            **extra_fields,
         )
 
 
+class RecentTasksMiddleware(Middleware):
+    """This middleware keeps the last tasks run by each worker process
+    in memory, without writing to the database.
+
+    When ``DRAMATIQ_TASKS_RECENT`` has a ``SNAPSHOT_DIR``, the records
+    are written to a file in that directory at most every
+    ``SNAPSHOT_INTERVAL`` seconds, so they can be inspected with the
+    ``dramatiqrecenttasks`` command.  The file is removed on shutdown.
+    """
+
+    def __init__(self):
+        recent_settings = DjangoDramatiqConfig.tasks_recent_settings()
+        self.records = deque(maxlen=recent_settings.get("MAX_SIZE", recent.DEFAULT_MAX_SIZE))
+        self.running = {}
+        self.snapshot_dir = recent_settings.get("SNAPSHOT_DIR")
+        self.snapshot_interval = recent_settings.get("SNAPSHOT_INTERVAL", recent.DEFAULT_SNAPSHOT_INTERVAL)
+        self.snapshot_lock = threading.Lock()
+        self.last_snapshot_at = 0
+
+    def snapshot(self):
+        """Write the current records to this process' snapshot file."""
+        with self.snapshot_lock:
+            if self.snapshot_dir is None:
+                return
+
+            self.last_snapshot_at = time.monotonic()
+            try:
+                recent.write_snapshot(self.snapshot_dir, tuple(self.records))
+            except OSError:
+                logging.getLogger("django_dramatiq.RecentTasksMiddleware").warning(
+                    "Failed to write recent tasks snapshot to %r.", self.snapshot_dir, exc_info=True
+                )
+
+    def before_process_message(self, broker, message):
+        from .models import Task
+
+        record = recent.TaskRecord(
+            message.message_id, message.actor_name, message.queue_name, Task.STATUS_RUNNING, time.time()
+        )
+        self.running[message.message_id] = record
+        self.records.append(record)
+
+    def after_skip_message(self, broker, message):
+        from .models import Task
+
+        self.after_process_message(broker, message, status=Task.STATUS_SKIPPED)
+
+    def after_process_message(self, broker, message, *, result=None, exception=None, status=None):
+        from .models import Task
+
+        record = self.running.pop(message.message_id, None)
+        if record is None:
+            record = recent.TaskRecord(message.message_id, message.actor_name, message.queue_name, None, None)
+            self.records.append(record)
+
+        if exception is not None:
+            record.status = Task.STATUS_FAILED
+            record.failure_reason = f"{type(exception).__name__}: {exception}"[:300]
+        else:
+            record.status = status or Task.STATUS_DONE
+        record.finished_at = time.time()
+
+        if (
+            self.snapshot_dir is not None
+            and time.monotonic() - self.last_snapshot_at >= self.snapshot_interval
+            and not self.snapshot_lock.locked()
+        ):
+            self.snapshot()
+
+    def before_worker_shutdown(self, broker, worker):
+        with self.snapshot_lock:
+            if self.snapshot_dir is None:
+                return
+
+            # Stop snapshotting, so messages that are still finishing
+            # don't bring the file back.
+            snapshot_dir, self.snapshot_dir = self.snapshot_dir, None
+            try:
+                recent.remove_snapshot(snapshot_dir)
+            except OSError:
+                logging.getLogger("django_dramatiq.RecentTasksMiddleware").warning(
+                    "Failed to remove recent tasks snapshot from %r.", snapshot_dir, exc_info=True
+                )
+
+
 class DbConnectionsMiddleware(Middleware):
-    """This middleware cleans up db connections on worker shutdown."""
+    """This middleware cleans up db connections on worker shutdown.
+
+    After each message, only the connections the message's actor ran
+    queries on are checked and closed if they're unusable or obsolete.
+    Before each message, only the connections the worker thread already
+    has open are.  Actors that don't use the database at all can opt
+    out of the former with ``close_old_connections=False``.
+
+    When ``DRAMATIQ_DB_POOL`` is configured, connections to PostgreSQL
+    are pooled per worker process.  Threads take a connection from the
+    pool when a message first queries the database, and give it back
+    when its actor is done with it.  Connections other middleware use
+    after that, like the `AdminMiddleware` storing the Task, are only
+    given back before the thread's next message.
+    """
+
+    actor_options = {"close_old_connections"}
 
-    def _close_old_connections(self, *args, **kwargs):
-        db.close_old_connections()
+    def __init__(self):
+        self.state = threading.local()
+        self.pool_settings = DjangoDramatiqConfig.db_pool_settings()
+        self.pooled_aliases = []
 
-    before_process_message = _close_old_connections
-    after_process_message = _close_old_connections
+    def before_worker_boot(self, broker, worker):
+        if self.pool_settings:
+            self.pooled_aliases = pool.configure_pools(self.pool_settings, worker.worker_threads)
+
+    def _get_used_aliases(self):
+        # Execute wrappers are installed on the connections of each
+        # thread the first time a message is processed on it, since
+        # connection objects are thread-local.
+        used_aliases = getattr(self.state, "used_aliases", None)
+        if used_aliases is None:
+            used_aliases = self.state.used_aliases = set()
+            for alias in db.connections:
+                db.connections[alias].execute_wrappers.append(self._make_execute_wrapper(alias, used_aliases))
+        return used_aliases
+
+    def _make_execute_wrapper(self, alias, used_aliases):
+        def execute_wrapper(execute, sql, params, many, context):
+            used_aliases.add(alias)
+            return execute(sql, params, many, context)
+
+        return execute_wrapper
+
+    def _should_close_old_connections(self, broker, message):
+        try:
+            actor = broker.get_actor(message.actor_name)
+        except ActorNotFound:
+            return True
+        return actor.options.get("close_old_connections", True)
+
+    def before_process_message(self, broker, message):
+        used_aliases = self._get_used_aliases()
+        used_aliases.clear()
+
+        # Even actors that opted out get this check, since the thread's
+        # connections are also used by other middleware, like the
+        # AdminMiddleware when it stores Tasks.
+        for connection in db.connections.all(initialized_only=True):
+            if connection.connection is not None:
+                connection.close_if_unusable_or_obsolete()
+
+    def after_process_message(self, broker, message, *args, **kwargs):
+        used_aliases = self._get_used_aliases()
+        if self._should_close_old_connections(broker, message):
+            for alias in used_aliases:
+                db.connections[alias].close_if_unusable_or_obsolete()
+        used_aliases.clear()
 
     def _close_connections(self, *args, **kwargs):
         db.connections.close_all()
 
     before_consumer_thread_shutdown = _close_connections
     before_worker_thread_shutdown = _close_connections
-    before_worker_shutdown = _close_connections
+
+    def before_worker_shutdown(self, broker, worker):
+        self._close_connections()
+        pool.close_pools(self.pooled_aliases)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_dramatiq', '0006_task_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='eta',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='failure_reason',
+            field=models.CharField(max_length=300, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='retries',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
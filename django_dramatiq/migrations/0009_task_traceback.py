@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_dramatiq', '0008_task_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='traceback',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='traceback_fingerprint',
+            field=models.CharField(db_index=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:33
+
+import django.db.models.manager
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_dramatiq', '0009_task_traceback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskFailure',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('actor_name', models.CharField(max_length=300, null=True)),
+                ('exception_type', models.CharField(max_length=300)),
+                ('failure_reason', models.CharField(max_length=300, null=True)),
+                ('count', models.PositiveBigIntegerField(default=1)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('sample_message_id', models.UUIDField()),
+            ],
+            options={
+                'ordering': ['-last_seen'],
+            },
+            managers=[
+                ('failures', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
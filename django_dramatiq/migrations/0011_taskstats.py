@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:34
+
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_dramatiq', '0010_taskfailure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStats',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('bucket', models.DateTimeField()),
+                ('actor_name', models.CharField(max_length=300)),
+                ('queue_name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('enqueued', 'Enqueued'), ('delayed', 'Delayed'), ('running', 'Running'), ('failed', 'Failed'), ('done', 'Done'), ('skipped', 'Skipped')], max_length=8)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_duration', models.FloatField(default=0)),
+                ('max_duration', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'task stats',
+                'ordering': ['-bucket'],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'actor_name', 'queue_name', 'status'), name='dramatiq_taskstats_unique_bucket')],
+            },
+            managers=[
+                ('stats', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
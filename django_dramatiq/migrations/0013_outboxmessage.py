@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:45
+
+import django.db.models.manager
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_dramatiq', '0012_task_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('message_id', models.UUIDField()),
+                ('actor_name', models.CharField(max_length=300)),
+                ('queue_name', models.CharField(max_length=100)),
+                ('message_data', models.BinaryField()),
+                ('delay', models.PositiveIntegerField(null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+            managers=[
+                ('messages', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,29 +1,261 @@
-from datetime import timedelta
+import logging
+import time
+from datetime import datetime, timedelta, timezone
 
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Greatest
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from dramatiq import Message
 
 from .apps import DjangoDramatiqConfig
+from .compression import DEFAULT_THRESHOLD, compress, decompress
+from .partitions import drop_partitions, get_partitioning_settings
+
+LOGGER = logging.getLogger("django_dramatiq.models")
 
 #: The database label to use when storing task metadata.
 DATABASE_LABEL = DjangoDramatiqConfig.tasks_database()
 
+#: The default number of Tasks to delete per query when pruning.
+DEFAULT_DELETE_BATCH_SIZE = 1000
+
+#: The default number of seconds to sleep between delete queries.
+DEFAULT_DELETE_BATCH_DELAY = 0.1
+
+#: The keys of the ``DRAMATIQ_TASKS_RETENTION`` setting and the fields
+#: they match on, from highest to lowest precedence.
+RETENTION_FIELDS = [
+    ("ACTORS", "actor_name"),
+    ("QUEUES", "queue_name"),
+    ("STATUSES", "status"),
+]
+
+
+def encode_message_data(message):
+    """Encode `message` for storage, compressing it according to the
+    ``DRAMATIQ_TASKS_COMPRESSION`` setting.
+
+    The traceback the ``Retries`` middleware adds to the options of
+    retried messages is left out, since it's stored in its own column.
+    """
+    if "traceback" in message.options:
+        message = message.copy()
+        del message.options["traceback"]
+
+    compression_settings = DjangoDramatiqConfig.tasks_compression_settings()
+    if not compression_settings:
+        return message.encode()
+
+    return compress(
+        message.encode(),
+        algorithm=compression_settings.get("ALGORITHM", "zlib"),
+        threshold=compression_settings.get("THRESHOLD", DEFAULT_THRESHOLD),
+        level=compression_settings.get("LEVEL"),
+    )
+
+
+def _datetime_from_timestamp(timestamp):
+    # Django expects a timezone-aware datetime if USE_TZ is True, and a naive datetime in localtime otherwise.
+    tz = timezone.utc if settings.USE_TZ else None
+    return datetime.fromtimestamp(timestamp / 1000, tz=tz)
+
+
+def get_message_eta(message):
+    """Get the time at which `message` is due to be processed."""
+    return _datetime_from_timestamp(message.options.get("eta", message.message_timestamp))
+
+
+def get_message_created_at(message):
+    """Get the time at which `message` was first enqueued.  This
+    doesn't change when the message is retried.
+    """
+    return _datetime_from_timestamp(message.message_timestamp)
+
 
 class TaskManager(models.Manager):
     def create_or_update_from_message(self, message, **extra_fields):
-        task, _ = self.using(DATABASE_LABEL).update_or_create(
-            id=message.message_id,
-            defaults={
-                "message_data": message.encode(),
-                **extra_fields,
-            },
-        )
+        """Store the Task for `message`, creating it if it doesn't exist
+        and setting `extra_fields` on it.  An existing Task that is
+        further along in the message's lifecycle than the status in
+        `extra_fields` is left alone.
+        """
+        fields = {"message_data": encode_message_data(message), **extra_fields}
+        with transaction.atomic(using=DATABASE_LABEL):
+            task, created = (
+                self.using(DATABASE_LABEL)
+                .select_for_update()
+                .get_or_create(
+                    id=message.message_id,
+                    defaults={
+                        "created_at": get_message_created_at(message),
+                        "retries": message.options.get("retries", 0),
+                        **fields,
+                    },
+                )
+            )
+            if created or not self.model.can_update(task, message, extra_fields.get("status")):
+                return task
+
+            for name, value in fields.items():
+                setattr(task, name, value)
+            task.save(using=DATABASE_LABEL, update_fields=["updated_at", *fields])
         return task
 
-    def delete_old_tasks(self, max_task_age):
-        self.using(DATABASE_LABEL).filter(created_at__lte=now() - timedelta(seconds=max_task_age)).delete()
+    def bulk_create_or_update_from_messages(self, updates):
+        """Upsert a batch of ``(message, extra_fields)`` pairs.  When a
+        message appears more than once, its last update wins.
+
+        Updates that set the same fields are written in a single query,
+        so that a field is never reset on Tasks whose update didn't set
+        it.  Like `create_or_update_from_message`, existing Tasks that
+        are further along than their update are left alone.
+        """
+        updates = {str(message.message_id): (message, extra_fields) for message, extra_fields in updates}
+        if not updates:
+            return []
+
+        queryset = self.using(DATABASE_LABEL)
+        existing_ids = {str(task_id) for task_id in queryset.filter(id__in=updates).values_list("id", flat=True)}
+        updated_at = now()
+        created, groups = [], {}
+        for message_id, (message, extra_fields) in updates.items():
+            task = self.model(
+                id=message_id,
+                message_data=encode_message_data(message),
+                created_at=get_message_created_at(message),
+                updated_at=updated_at,
+                **{"retries": message.options.get("retries", 0), **extra_fields},
+            )
+            if message_id in existing_ids:
+                key = (message.options.get("retries", 0), extra_fields.get("status"), frozenset(extra_fields))
+                groups.setdefault(key, []).append(task)
+            else:
+                created.append(task)
+
+        # Tasks inserted by another process in the meantime are left
+        # alone.  Whatever wrote them has seen the message more recently.
+        # The writes get their own savepoint, so failing them doesn't
+        # break the transaction they may be part of.
+        with transaction.atomic(using=DATABASE_LABEL):
+            queryset.bulk_create(created, ignore_conflicts=True)
+            for (retries, status, fields), group in groups.items():
+                queryset.filter(self.model.get_precedence_filter(retries, status)).bulk_update(
+                    group, sorted({"message_data", "updated_at", *fields})
+                )
+        return [*created, *(task for group in groups.values() for task in group)]
+
+    def update_status_from_message(self, message, status, **extra_fields):
+        """Set the status of the Task for `message`, along with any of
+        its timing fields in `extra_fields`, without re-encoding or
+        rewriting its message data.  The Task is created from `message`
+        and `extra_fields` if it doesn't exist yet.
+        """
+        timings = {field: extra_fields[field] for field in self.model.TIMING_FIELDS if field in extra_fields}
+        queryset = self.using(DATABASE_LABEL).filter(id=message.message_id)
+        precedence_filter = self.model.get_precedence_filter(message.options.get("retries", 0), status)
+        if queryset.filter(precedence_filter).update(status=status, updated_at=now(), **timings):
+            return
+        if not queryset.exists():
+            self.create_or_update_from_message(message, status=status, **extra_fields)
+
+    def bulk_update_status_from_messages(self, updates):
+        """Like `update_status_from_message`, but for a batch of
+        ``(message, extra_fields)`` pairs.  Existing Tasks only get
+        their status updated, the others are created.
+        """
+        updates = {str(message.message_id): (message, extra_fields) for message, extra_fields in updates}
+        if not updates:
+            return
+
+        queryset = self.using(DATABASE_LABEL)
+        existing_ids = {str(task_id) for task_id in queryset.filter(id__in=updates).values_list("id", flat=True)}
+        updated_at = now()
+        groups = {}
+        for message_id in existing_ids:
+            message, extra_fields = updates[message_id]
+            timings = {field: extra_fields[field] for field in self.model.TIMING_FIELDS if field in extra_fields}
+            task = self.model(id=message_id, status=extra_fields["status"], updated_at=updated_at, **timings)
+            key = (message.options.get("retries", 0), extra_fields["status"], frozenset(timings))
+            groups.setdefault(key, []).append(task)
+
+        for (retries, status, fields), group in groups.items():
+            queryset.filter(self.model.get_precedence_filter(retries, status)).bulk_update(
+                group, ["status", "updated_at", *sorted(fields)]
+            )
+        self.bulk_create_or_update_from_messages(
+            update for message_id, update in updates.items() if message_id not in existing_ids
+        )
+
+    def delete_old_tasks(
+        self,
+        max_task_age,
+        *,
+        batch_size=DEFAULT_DELETE_BATCH_SIZE,
+        batch_delay=DEFAULT_DELETE_BATCH_DELAY,
+    ):
+        """Delete Tasks created more than `max_task_age` seconds ago.
+        Returns the number of deleted Tasks.
+
+        Tasks matching a rule in the ``DRAMATIQ_TASKS_RETENTION``
+        setting are kept for as long as that rule says instead.  When
+        several rules match a Task, actor rules take precedence over
+        queue rules, which take precedence over status rules.
+
+        Tasks are deleted oldest first, `batch_size` at a time, with a
+        pause of `batch_delay` seconds between batches so that pruning
+        a large table doesn't hold locks for long.  When the table is
+        partitioned, partitions that only hold expired Tasks are dropped
+        first, and their Tasks aren't included in the returned count.
+        """
+        retention = DjangoDramatiqConfig.tasks_retention_settings()
+        partitioning = get_partitioning_settings()
+        if partitioning:
+            # Only drop partitions that no retention rule wants to keep.
+            max_age = max(
+                [max_task_age, *(age for key, _ in RETENTION_FIELDS for age in retention.get(key, {}).values())]
+            )
+            dropped = drop_partitions(
+                connections[DATABASE_LABEL],
+                self.model,
+                interval=partitioning["INTERVAL"],
+                before=now() - timedelta(seconds=max_age),
+            )
+            if dropped:
+                LOGGER.info("Dropped Task partitions %s.", ", ".join(dropped))
+
+        queryset = self.using(DATABASE_LABEL)
+        deleted, claimed = 0, Q()
+        for key, field in RETENTION_FIELDS:
+            rules = retention.get(key, {})
+            for value, max_age in rules.items():
+                rule_queryset = queryset.filter(**{field: value}, created_at__lte=now() - timedelta(seconds=max_age))
+                deleted += self._delete_in_batches(rule_queryset.exclude(claimed), batch_size, batch_delay)
+
+            if rules:
+                claimed |= Q(**{f"{field}__in": list(rules)})
+
+        default_queryset = queryset.filter(created_at__lte=now() - timedelta(seconds=max_task_age))
+        deleted += self._delete_in_batches(default_queryset.exclude(claimed), batch_size, batch_delay)
+        return deleted
+
+    def _delete_in_batches(self, queryset, batch_size, batch_delay):
+        deleted = 0
+        while True:
+            task_ids = list(queryset.order_by("created_at").values_list("id", flat=True)[:batch_size])
+            if not task_ids:
+                break
+
+            # Tasks have no relations, so Django's deletion collector
+            # can be skipped entirely.
+            deleted += self.using(DATABASE_LABEL).filter(id__in=task_ids)._raw_delete(DATABASE_LABEL)
+            if len(task_ids) < batch_size:
+                break
+
+            time.sleep(batch_delay)
+        return deleted
 
 
 class Task(models.Model):
@@ -42,23 +274,307 @@ class Task(models.Model):
         (STATUS_SKIPPED, "Skipped"),
     ]
 
+    #: The order in which statuses occur during a single delivery of a
+    #: message.  An update to a lower rank must never replace a pending
+    #: update to a higher one.
+    FINAL_STATUS_RANK = 2
+    STATUS_RANKS = {
+        STATUS_ENQUEUED: 0,
+        STATUS_DELAYED: 0,
+        STATUS_RUNNING: 1,
+        STATUS_FAILED: FINAL_STATUS_RANK,
+        STATUS_DONE: FINAL_STATUS_RANK,
+        STATUS_SKIPPED: FINAL_STATUS_RANK,
+    }
+
     id = models.UUIDField(primary_key=True, editable=False)
     status = models.CharField(max_length=8, choices=STATUSES, default=STATUS_ENQUEUED)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the message's timestamp, so that the (id, created_at)
+    # primary key of partitioned tables is stable across updates.
+    created_at = models.DateTimeField(default=now, editable=False, db_index=True)
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
     message_data = models.BinaryField()
 
     actor_name = models.CharField(max_length=300, null=True)
     queue_name = models.CharField(max_length=100, null=True)
 
+    # Denormalized from the message so the admin doesn't have to decode it.
+    eta = models.DateTimeField(null=True)
+    retries = models.PositiveIntegerField(default=0)
+    failure_reason = models.CharField(max_length=300, null=True)
+
+    # When the last attempt at processing the message was enqueued,
+    # started and finished.
+    enqueued_at = models.DateTimeField(null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True, db_index=True)
+
+    # Stored outside of the message so that it isn't sent back through
+    # the broker when the message is retried.  Only set on the first of
+    # a series of failures with the same fingerprint.
+    traceback = models.TextField(null=True)
+    traceback_fingerprint = models.CharField(max_length=32, null=True, db_index=True)
+
+    #: The fields that status updates write along with the status.
+    TIMING_FIELDS = ("enqueued_at", "started_at", "finished_at")
+
+    @classmethod
+    def get_precedence(cls, retries, status):
+        """Get the position of `status` in the lifecycle of a message
+        that has been retried `retries` times.  Updates never replace
+        ones with a higher precedence.
+        """
+        return (retries, cls.STATUS_RANKS.get(status, 0))
+
+    @classmethod
+    def get_precedence_filter(cls, retries, status):
+        """Get a filter matching the Tasks that an update to `status`
+        for a message retried `retries` times may overwrite.
+        """
+        if status is None:
+            return Q()
+
+        rank = cls.STATUS_RANKS.get(status, 0)
+        statuses = [other for other, other_rank in cls.STATUS_RANKS.items() if other_rank <= rank]
+        return Q(retries__lt=retries) | Q(retries=retries, status__in=statuses)
+
+    @classmethod
+    def can_update(cls, task, message, status):
+        """Check whether an update of `message` to `status` may
+        overwrite `task`.
+        """
+        if status is None:
+            return True
+        return cls.get_precedence(task.retries, task.status) <= cls.get_precedence(
+            message.options.get("retries", 0), status
+        )
+
     tasks = TaskManager()
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            # Used when pruning Tasks according to per-status retention rules.
+            models.Index(fields=["status", "created_at"], name="dramatiq_task_status_created"),
+            # Used by the admin changelist's filters, which sort by updated_at.
+            models.Index(fields=["status", "updated_at"], name="dramatiq_task_status_updated"),
+            models.Index(fields=["queue_name", "status", "updated_at"], name="dramatiq_task_queue_updated"),
+            models.Index(fields=["actor_name", "updated_at"], name="dramatiq_task_actor_updated"),
+        ]
+
+    def get_traceback(self):
+        """Get the traceback of this Task's last failure.  When it
+        wasn't stored because it was a duplicate, the traceback of
+        another Task with the same fingerprint is returned instead.
+        """
+        if self.traceback:
+            return self.traceback
+        if self.traceback_fingerprint:
+            return (
+                type(self)
+                .tasks.using(self._state.db)
+                .filter(traceback_fingerprint=self.traceback_fingerprint, traceback__isnull=False)
+                .values_list("traceback", flat=True)
+                .first()
+            )
+
+        # Older versions stored tracebacks in the message's options.
+        return self.message.options.get("traceback")
+
+    @property
+    def latency(self):
+        """The time the message spent in its queue once it was due."""
+        if self.enqueued_at is None or self.started_at is None:
+            return None
+        return self.started_at - max(self.enqueued_at, self.eta or self.enqueued_at)
+
+    @property
+    def runtime(self):
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
 
     @cached_property
     def message(self):
-        return Message.decode(bytes(self.message_data))
+        return Message.decode(decompress(bytes(self.message_data)))
 
     def __str__(self):
         return str(self.message)
+
+
+class TaskFailureManager(models.Manager):
+    def record_failure(self, fingerprint, *, message_id, count=1, **fields):
+        """Count `count` failures with the given `fingerprint`, creating
+        its aggregate if this is the first time it's seen.  `message_id`
+        becomes the aggregate's sample message and `fields` are set on
+        it.
+        """
+        queryset = self.using(DATABASE_LABEL)
+        seen_at = now()
+        updates = {"count": F("count") + count, "last_seen": seen_at, "sample_message_id": message_id, **fields}
+        if queryset.filter(fingerprint=fingerprint).update(**updates):
+            return
+
+        try:
+            with transaction.atomic(using=DATABASE_LABEL):
+                queryset.create(
+                    fingerprint=fingerprint,
+                    count=count,
+                    first_seen=seen_at,
+                    last_seen=seen_at,
+                    sample_message_id=message_id,
+                    **fields,
+                )
+        except IntegrityError:
+            # Another worker created it in the meantime.
+            queryset.filter(fingerprint=fingerprint).update(**updates)
+
+
+class TaskFailure(models.Model):
+    """Failures of Tasks, aggregated by traceback fingerprint."""
+
+    id = models.BigAutoField(primary_key=True)
+    fingerprint = models.CharField(max_length=32, unique=True)
+    actor_name = models.CharField(max_length=300, null=True)
+    exception_type = models.CharField(max_length=300)
+    failure_reason = models.CharField(max_length=300, null=True)
+    count = models.PositiveBigIntegerField(default=1)
+    first_seen = models.DateTimeField(default=now)
+    last_seen = models.DateTimeField(default=now, db_index=True)
+
+    # The id of the last failed message.  Not a foreign key, since
+    # the Task may be pruned or may never have been stored.
+    sample_message_id = models.UUIDField()
+
+    failures = TaskFailureManager()
+
+    class Meta:
+        ordering = ["-last_seen"]
+
+    def __str__(self):
+        return f"{self.exception_type} in {self.actor_name}"
+
+
+class TaskStatsManager(models.Manager):
+    def add_counts(self, counters):
+        """Add in-memory counters to the rollups.  `counters` maps
+        ``(bucket, actor_name, queue_name, status)`` keys to
+        ``[count, total_duration, max_duration]`` values.
+        """
+        queryset = self.using(DATABASE_LABEL)
+        for (bucket, actor_name, queue_name, status), (count, total_duration, max_duration) in counters.items():
+            lookup = {"bucket": bucket, "actor_name": actor_name, "queue_name": queue_name, "status": status}
+            updates = {"count": F("count") + count, "total_duration": F("total_duration") + total_duration}
+            if max_duration is not None:
+                updates["max_duration"] = Greatest(Coalesce("max_duration", max_duration), max_duration)
+
+            if queryset.filter(**lookup).update(**updates):
+                continue
+
+            try:
+                with transaction.atomic(using=DATABASE_LABEL):
+                    queryset.create(
+                        **lookup,
+                        count=count,
+                        total_duration=total_duration,
+                        max_duration=max_duration,
+                    )
+            except IntegrityError:
+                # Another worker created it in the meantime.
+                queryset.filter(**lookup).update(**updates)
+
+    def delete_old_stats(self, max_age):
+        """Delete the rollups for buckets older than `max_age` seconds."""
+        return (
+            self.using(DATABASE_LABEL).filter(bucket__lt=now() - timedelta(seconds=max_age))._raw_delete(DATABASE_LABEL)
+        )
+
+
+class TaskStats(models.Model):
+    """Per-minute counts of the Tasks that reached each status, per
+    actor and queue.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    bucket = models.DateTimeField()
+    actor_name = models.CharField(max_length=300)
+    queue_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=8, choices=Task.STATUSES)
+    count = models.PositiveBigIntegerField(default=0)
+
+    # In seconds, for the Tasks that ran.
+    total_duration = models.FloatField(default=0)
+    max_duration = models.FloatField(null=True)
+
+    stats = TaskStatsManager()
+
+    class Meta:
+        ordering = ["-bucket"]
+        verbose_name_plural = "task stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket", "actor_name", "queue_name", "status"],
+                name="dramatiq_taskstats_unique_bucket",
+            ),
+        ]
+
+
+class OutboxMessageManager(models.Manager):
+    def add_message(self, message, *, delay=None, using=DEFAULT_DB_ALIAS):
+        """Store `message` in the outbox of the `using` database."""
+        return self.using(using).create(
+            message_id=message.message_id,
+            actor_name=message.actor_name,
+            queue_name=message.queue_name,
+            message_data=message.encode(),
+            delay=delay,
+        )
+
+    def relay(self, broker, *, batch_size, using=DEFAULT_DB_ALIAS):
+        """Enqueue the oldest `batch_size` messages of the outbox on
+        `broker` and remove them from it.  Returns the number of relayed
+        messages.
+
+        Rows locked by other relays are skipped, so that several relays
+        can drain the same outbox.  If enqueueing fails, the whole batch
+        stays in the outbox, and the messages that were already
+        enqueued will be enqueued again.  Failing to write their Tasks
+        doesn't keep them in the outbox.
+        """
+        from .bulk import defer_task_writes
+
+        with transaction.atomic(using=using):
+            queryset = self.using(using)
+            rows = list(queryset.select_for_update(skip_locked=True).order_by("id")[:batch_size])
+            if not rows:
+                return 0
+
+            with defer_task_writes():
+                for row in rows:
+                    broker.enqueue(Message.decode(bytes(row.message_data)), delay=row.delay)
+
+            queryset.filter(id__in=[row.id for row in rows])._raw_delete(using)
+        return len(rows)
+
+
+class OutboxMessage(models.Model):
+    """A message waiting to be enqueued, stored in the same transaction
+    as the changes that sent it.
+    """
+
+    # The outbox can see a lot of churn.
+    id = models.BigAutoField(primary_key=True)
+    message_id = models.UUIDField()
+    actor_name = models.CharField(max_length=300)
+    queue_name = models.CharField(max_length=100)
+    message_data = models.BinaryField()
+    delay = models.PositiveIntegerField(null=True)
+    created_at = models.DateTimeField(default=now)
+
+    messages = OutboxMessageManager()
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.actor_name} ({self.message_id})"
@@ -0,0 +1,115 @@
+"""A transactional outbox for enqueueing messages.
+
+Messages sent through the outbox are stored in the database, as part of
+the current transaction, instead of being enqueued on the broker.  A
+relay process then enqueues them in batches.  Messages are only
+enqueued once the transaction that sent them commits, and sending
+them only costs a local insert.
+"""
+
+import logging
+import time
+
+import dramatiq
+from django import db
+from django.db import DEFAULT_DB_ALIAS
+
+from .apps import DjangoDramatiqConfig
+
+LOGGER = logging.getLogger("django_dramatiq.outbox")
+
+#: The default number of messages to relay per transaction.
+DEFAULT_BATCH_SIZE = 100
+
+#: The default number of seconds the relay waits for new messages once
+#: the outbox is empty.
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def get_outbox_settings():
+    """Get the ``DRAMATIQ_OUTBOX`` settings with their defaults filled in."""
+    outbox_settings = DjangoDramatiqConfig.outbox_settings()
+    return {
+        "DATABASE": outbox_settings.get("DATABASE", DEFAULT_DB_ALIAS),
+        "BATCH_SIZE": outbox_settings.get("BATCH_SIZE", DEFAULT_BATCH_SIZE),
+        "POLL_INTERVAL": outbox_settings.get("POLL_INTERVAL", DEFAULT_POLL_INTERVAL),
+    }
+
+
+def enqueue_via_outbox(message, *, delay=None, using=None):
+    """Store `message` in the outbox, to be enqueued by the relay once
+    the current transaction on the `using` database commits.
+
+    Parameters:
+      message(Message): The message to enqueue.
+      delay(int): The minimum amount of time, in milliseconds, the
+        message should be delayed by once it's relayed.
+      using(str): The alias of the database to store the message in.
+        Defaults to the ``DATABASE`` of ``DRAMATIQ_OUTBOX``.
+
+    Returns:
+      Message: The message.
+    """
+    from .models import OutboxMessage
+
+    OutboxMessage.messages.add_message(message, delay=delay, using=using or get_outbox_settings()["DATABASE"])
+    return message
+
+
+def send_via_outbox(actor, *args, **kwargs):
+    """Send a message to `actor` through the outbox.
+
+    Returns:
+      Message: The message.
+    """
+    return enqueue_via_outbox(actor.message(*args, **kwargs))
+
+
+def send_with_options_via_outbox(actor, *, args=(), kwargs=None, delay=None, using=None, **options):
+    """Send a message to `actor` through the outbox.  Like
+    ``Actor.send_with_options``.
+
+    Returns:
+      Message: The message.
+    """
+    message = actor.message_with_options(args=args, kwargs=kwargs, **options)
+    return enqueue_via_outbox(message, delay=delay, using=using)
+
+
+def relay_outbox(*, broker=None, batch_size=None, using=None):
+    """Enqueue a batch of messages from the outbox.  Returns the number
+    of relayed messages.
+    """
+    from .models import OutboxMessage
+
+    outbox_settings = get_outbox_settings()
+    return OutboxMessage.messages.relay(
+        broker or dramatiq.get_broker(),
+        batch_size=batch_size or outbox_settings["BATCH_SIZE"],
+        using=using or outbox_settings["DATABASE"],
+    )
+
+
+def run_relay():
+    """Relay messages from the outbox until the process is stopped.
+    Meant to be run with ``rundramatiq --outbox-relay``.
+    """
+    # Make sure Django is set up when the process was spawned.
+    from . import setup  # noqa: F401
+
+    outbox_settings = get_outbox_settings()
+    LOGGER.info("Relaying messages from the %r database's outbox.", outbox_settings["DATABASE"])
+    while True:
+        try:
+            relayed = relay_outbox()
+        except Exception:
+            # The batch stays in the outbox, so it's retried next time.
+            LOGGER.exception("Failed to relay messages from the outbox.")
+            relayed = 0
+        finally:
+            db.close_old_connections()
+
+        if relayed:
+            LOGGER.debug("Relayed %d messages from the outbox.", relayed)
+        if relayed < outbox_settings["BATCH_SIZE"]:
+            time.sleep(outbox_settings["POLL_INTERVAL"])
@@ -0,0 +1,42 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """A paginator that avoids running an exact ``COUNT(*)`` over large
+    tables on PostgreSQL by using the query planner's row estimate
+    instead.  Exact counts are used on other databases and whenever
+    the estimate is below `exact_count_threshold`.
+    """
+
+    #: Querysets estimated to have fewer rows than this get counted exactly.
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if estimate is not None and estimate >= self.exact_count_threshold:
+            return estimate
+        return super().count
+
+    def estimate_count(self):
+        """Get the planner's estimate of the number of rows in the
+        object list, or None if it can't be estimated.
+        """
+        queryset = self.object_list
+        if not hasattr(queryset, "explain") or connections[queryset.db].vendor != "postgresql":
+            return None
+
+        # QuerySet.explain() re-encodes the plan that the driver already
+        # decoded, so the plan is fetched directly instead.
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            (plan,) = cursor.fetchone()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
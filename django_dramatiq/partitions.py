@@ -0,0 +1,197 @@
+"""Support for storing Tasks in a table that is range-partitioned on
+``created_at``, so that old Tasks can be pruned by dropping whole
+partitions.  Only PostgreSQL is supported.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import NotSupportedError, transaction
+
+from .apps import DjangoDramatiqConfig
+
+INTERVALS = ("day", "week", "month")
+
+#: The default size of each partition.
+DEFAULT_INTERVAL = "day"
+
+#: The default number of partitions to create ahead of time.
+DEFAULT_PREMAKE = 7
+
+
+def get_partitioning_settings():
+    """Get the ``DRAMATIQ_TASKS_PARTITIONING`` settings with their
+    defaults filled in, or None if partitioning is disabled.
+    """
+    partitioning_settings = DjangoDramatiqConfig.tasks_partitioning_settings()
+    if not partitioning_settings:
+        return None
+
+    interval = partitioning_settings.get("INTERVAL", DEFAULT_INTERVAL)
+    if interval not in INTERVALS:
+        raise ValueError(f"Invalid partitioning interval: {interval!r}.  Expected one of {INTERVALS!r}.")
+
+    return {
+        "INTERVAL": interval,
+        "PREMAKE": partitioning_settings.get("PREMAKE", DEFAULT_PREMAKE),
+    }
+
+
+def get_partition_start(moment, interval):
+    """Get the start of the partition that `moment` falls into."""
+    start = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+    if interval == "week":
+        return start - timedelta(days=start.weekday())
+    elif interval == "month":
+        return start.replace(day=1)
+    return start
+
+
+def get_next_partition_start(start, interval):
+    """Get the start of the partition following the one at `start`."""
+    if interval == "week":
+        return start + timedelta(days=7)
+    elif interval == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def get_partition_name(table, start):
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def get_default_partition_name(table):
+    return f"{table}_default"
+
+
+def parse_partition_name(table, name):
+    """Get the start of the partition called `name`, or None if it
+    isn't a range partition of `table`.
+    """
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+
+    try:
+        return datetime.strptime(name[len(prefix) :], "%Y%m%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def check_connection(connection):
+    if connection.vendor != "postgresql":
+        raise NotSupportedError("Task partitioning is only supported on PostgreSQL.")
+
+
+def list_partitions(connection, model):
+    """List the names of the partitions of `model`'s table."""
+    check_connection(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s ORDER BY child.relname",
+            [model._meta.db_table],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+def create_partitions(connection, model, *, interval, count, today=None):
+    """Create the partition for `today` and the `count` partitions
+    following it, unless they already exist.  Returns the names of
+    the partitions.
+
+    Rows of the default partition that fall into a new partition are
+    moved into it, since PostgreSQL refuses to create a partition for
+    a range the default partition holds rows in.
+    """
+    check_connection(connection)
+    table = model._meta.db_table
+    existing = set(list_partitions(connection, model))
+    has_default = get_default_partition_name(table) in existing
+    start = get_partition_start(today or datetime.now(timezone.utc), interval)
+    names = []
+    for _ in range(count + 1):
+        end = get_next_partition_start(start, interval)
+        name = get_partition_name(table, start)
+        if name not in existing:
+            if has_default:
+                create_partition_from_default(connection, table, name, start, end)
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} "
+                        f"PARTITION OF {connection.ops.quote_name(table)} "
+                        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                    )
+        names.append(name)
+        start = end
+    return names
+
+
+def create_partition_from_default(connection, table, name, start, end):
+    """Create the partition `name` of `table` for the range from
+    `start` to `end`, moving the rows the default partition holds in
+    that range into it.
+    """
+    qn = connection.ops.quote_name
+    default = get_default_partition_name(table)
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {qn(default)} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                f"INSERT INTO {qn(name)} SELECT * FROM moved",
+                [start, end],
+            )
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+
+
+def drop_partitions(connection, model, *, interval, before):
+    """Drop the range partitions that only hold rows created before
+    `before`.  Returns the names of the dropped partitions.
+    """
+    table = model._meta.db_table
+    dropped = []
+    with connection.cursor() as cursor:
+        for name in list_partitions(connection, model):
+            start = parse_partition_name(table, name)
+            if start is not None and get_next_partition_start(start, interval) <= before:
+                cursor.execute(f"DROP TABLE {connection.ops.quote_name(name)}")
+                dropped.append(name)
+    return dropped
+
+
+def partition_table(connection, model, *, interval, count):
+    """Convert `model`'s table into a table partitioned on created_at,
+    carrying its rows over, in a single transaction.  Rows that don't
+    fall into one of the new range partitions end up in a default
+    partition.
+    """
+    check_connection(connection)
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy_table = f"{table}_unpartitioned"
+    with transaction.atomic(using=connection.alias), connection.schema_editor(atomic=False) as schema_editor:
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy_table)}")
+            cursor.execute(
+                f"CREATE TABLE {qn(table)} (LIKE {qn(legacy_table)} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+            )
+            cursor.execute(f"CREATE TABLE {qn(get_default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT")
+            create_partitions(connection, model, interval=interval, count=count)
+            cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy_table)}")
+            cursor.execute(f"DROP TABLE {qn(legacy_table)}")
+
+            # Partitioned tables require the partition key to be part of
+            # every unique constraint, including the primary key.
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, created_at)")
+
+        # The indexes are recreated under the names Django expects so
+        # that future migrations can still alter them.  If that fails,
+        # the whole conversion is rolled back.
+        for statement in schema_editor._model_indexes_sql(model):
+            schema_editor.execute(statement)
@@ -0,0 +1,87 @@
+"""Support for pooling the PostgreSQL connections of worker threads
+through Django's ``OPTIONS["pool"]``, which requires Django 5.1+ and
+psycopg 3.
+"""
+
+import django
+from django import db
+from django.core.exceptions import ImproperlyConfigured
+
+#: The default min number of connections each worker process keeps open.
+DEFAULT_MIN_SIZE = 1
+
+#: The default number of seconds a thread waits for a connection.
+DEFAULT_TIMEOUT = 10.0
+
+#: The default number of seconds an idle connection is kept open for.
+DEFAULT_MAX_IDLE = 300.0
+
+#: The number of background threads that may use the database in each
+#: worker process: the `TaskBuffer` and `StatsCollector` flushers.
+BACKGROUND_THREADS = 2
+
+
+def get_pool_options(pool_settings, worker_threads):
+    """Get the options of a psycopg ``ConnectionPool`` from the
+    ``DRAMATIQ_DB_POOL`` setting.  Unless it says otherwise, each worker
+    process gets a connection per worker thread and background thread.
+    """
+    min_size = pool_settings.get("MIN_SIZE", DEFAULT_MIN_SIZE)
+    return {
+        "min_size": min_size,
+        "max_size": max(pool_settings.get("MAX_SIZE") or worker_threads + BACKGROUND_THREADS, min_size),
+        "timeout": pool_settings.get("TIMEOUT", DEFAULT_TIMEOUT),
+        "max_idle": pool_settings.get("MAX_IDLE", DEFAULT_MAX_IDLE),
+    }
+
+
+def get_pooled_aliases(pool_settings):
+    """Get the aliases of the databases whose connections are pooled.
+    Defaults to every PostgreSQL database.
+    """
+    aliases = pool_settings.get("ALIASES")
+    if aliases is not None:
+        return list(aliases)
+    return [alias for alias in db.connections if db.connections[alias].vendor == "postgresql"]
+
+
+def configure_pools(pool_settings, worker_threads):
+    """Turn on connection pooling for the current process.  This must
+    be called before worker threads connect to the database.  Returns
+    the aliases of the databases whose connections are now pooled.
+
+    Databases that already have a pool configured are left alone.
+    Pooled databases have persistent connections turned off, as Django
+    requires, and health checks turned on, so that connections are
+    checked when a thread takes them from the pool.
+    """
+    aliases = get_pooled_aliases(pool_settings)
+    for alias in aliases:
+        connection = db.connections[alias]
+        if connection.vendor != "postgresql":
+            raise ImproperlyConfigured(f"Connection pooling is only supported on PostgreSQL, not {alias!r}.")
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured("Connection pooling requires Django 5.1 or later.")
+
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        if not is_psycopg3:
+            raise ImproperlyConfigured("Connection pooling requires psycopg 3.")
+
+        # Connection objects are per-thread but share their settings.
+        settings_dict = db.connections.settings[alias]
+        options = settings_dict.setdefault("OPTIONS", {})
+        if options.get("pool"):
+            continue
+
+        connection.close()
+        options["pool"] = get_pool_options(pool_settings, worker_threads)
+        settings_dict["CONN_MAX_AGE"] = 0
+        settings_dict["CONN_HEALTH_CHECKS"] = True
+
+    return aliases
+
+
+def close_pools(aliases):
+    for alias in aliases:
+        db.connections[alias].close_pool()
@@ -0,0 +1,103 @@
+"""Records of the tasks recently run by a worker process, kept in
+memory by `RecentTasksMiddleware` and periodically written to snapshot
+files that the ``dramatiqrecenttasks`` command reads.  A process removes
+its snapshot file when it shuts down, and the snapshots of processes
+that are gone regardless are skipped.
+"""
+
+import glob
+import json
+import os
+import tempfile
+import time
+
+#: The default number of records kept per process.
+DEFAULT_MAX_SIZE = 1000
+
+#: The default min number of seconds between snapshots.
+DEFAULT_SNAPSHOT_INTERVAL = 5.0
+
+SNAPSHOT_PREFIX = "recent-tasks-"
+
+
+class TaskRecord:
+    """A task that was run by the current process."""
+
+    __slots__ = ("actor_name", "failure_reason", "finished_at", "message_id", "queue_name", "started_at", "status")
+
+    def __init__(self, message_id, actor_name, queue_name, status, started_at):
+        self.message_id = message_id
+        self.actor_name = actor_name
+        self.queue_name = queue_name
+        self.status = status
+        self.started_at = started_at
+        self.finished_at = None
+        self.failure_reason = None
+
+    def asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def get_snapshot_path(snapshot_dir, pid=None):
+    return os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{pid or os.getpid()}.json")
+
+
+def write_snapshot(snapshot_dir, records):
+    """Write `records` to the current process' snapshot file.  The
+    file is replaced atomically so readers never see partial writes.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    snapshot = {
+        "pid": os.getpid(),
+        "taken_at": time.time(),
+        "records": [record.asdict() for record in records],
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, get_snapshot_path(snapshot_dir))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def remove_snapshot(snapshot_dir):
+    """Remove the current process' snapshot file, if any."""
+    try:
+        os.unlink(get_snapshot_path(snapshot_dir))
+    except FileNotFoundError:
+        pass
+
+
+def is_running(pid):
+    """Check whether the process `pid` is running on this host."""
+    if os.name == "nt":
+        # Signal 0 can't be used to probe processes on Windows.
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(snapshot_dir):
+    """Read the snapshots of every running process in `snapshot_dir`,
+    skipping the ones that can't be parsed.
+    """
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        # Processes that were killed didn't get to remove their snapshot.
+        if is_running(snapshot["pid"]):
+            snapshots.append(snapshot)
+    return snapshots
@@ -0,0 +1,118 @@
+import atexit
+import logging
+import math
+import os
+import threading
+
+from django import db
+from django.utils.timezone import now
+
+LOGGER = logging.getLogger("django_dramatiq.StatsCollector")
+
+#: The default number of seconds between flushes.
+DEFAULT_FLUSH_INTERVAL = 10.0
+
+#: The default number of seconds statistics are kept for.
+DEFAULT_RETENTION = 60 * 60 * 24 * 7
+
+
+def get_bucket(moment):
+    """Get the start of the minute `moment` falls into."""
+    return moment.replace(second=0, microsecond=0)
+
+
+def get_percentiles(values, percentiles=(50, 95, 99)):
+    """Get the nearest-rank `percentiles` of `values`, or Nones if
+    there are no values.
+    """
+    values = sorted(values)
+    if not values:
+        return [None for _ in percentiles]
+    return [values[max(math.ceil(len(values) * percentile / 100) - 1, 0)] for percentile in percentiles]
+
+
+class StatsCollector:
+    """Counts tasks per minute, actor, queue and status in memory and
+    adds the counts to the `TaskStats` rollups from a background
+    thread every `flush_interval` seconds.
+
+    Parameters:
+      flush_interval(float): The number of seconds between flushes.
+    """
+
+    def __init__(self, *, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, actor_name, queue_name, status, duration=None):
+        """Count a task that reached `status`, optionally after
+        running for `duration` seconds.
+        """
+        key = (get_bucket(now()), actor_name, queue_name, status)
+        with self.lock:
+            self._ensure_thread()
+            counter = self.counters.get(key)
+            if counter is None:
+                counter = self.counters[key] = [0, 0.0, None]
+
+            counter[0] += 1
+            if duration is not None:
+                counter[1] += duration
+                counter[2] = duration if counter[2] is None else max(counter[2], duration)
+
+    def flush(self):
+        """Add the pending counts to the rollups."""
+        from .models import TaskStats
+
+        with self.lock:
+            counters, self.counters = self.counters, {}
+
+        if not counters:
+            return
+
+        LOGGER.debug("Flushing %d task stats.", len(counters))
+        try:
+            TaskStats.stats.add_counts(counters)
+        except Exception:
+            LOGGER.exception("Failed to flush %d task stats.", len(counters))
+
+    def close(self):
+        """Stop the background thread and flush any pending counts."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+
+        if thread is not None and self.pid == os.getpid():
+            self.stopping.set()
+            thread.join()
+            self.stopping.clear()
+
+        self.flush()
+
+    def _ensure_thread(self):
+        # The collector may be inherited by a forked process, in which
+        # case the flusher thread has to be started again.
+        if self.thread is not None and self.pid == os.getpid():
+            return
+
+        if self.pid is None:
+            atexit.register(self.close)
+
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name="django_dramatiq.StatsCollector", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopping.wait(self.flush_interval):
+                db.close_old_connections()
+                self.flush()
+                # Pooled connections go back to the pool instead of being
+                # held until the next flush.
+                db.close_old_connections()
+        finally:
+            db.connections.close_all()
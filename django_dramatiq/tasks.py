@@ -1,11 +1,49 @@
+import logging
+
 import dramatiq
+from django.db import DatabaseError, connections
+
+from .apps import DjangoDramatiqConfig
+from .models import DEFAULT_DELETE_BATCH_DELAY, DEFAULT_DELETE_BATCH_SIZE
+from .partitions import create_partitions, get_partitioning_settings
+from .stats import DEFAULT_RETENTION as DEFAULT_STATS_RETENTION
+
+LOGGER = logging.getLogger("django_dramatiq.tasks")
 
 
 @dramatiq.actor
-def delete_old_tasks(max_task_age=86400):
+def delete_old_tasks(
+    max_task_age=86400,
+    batch_size=DEFAULT_DELETE_BATCH_SIZE,
+    batch_delay=DEFAULT_DELETE_BATCH_DELAY,
+):
     """This task deletes all tasks older than `max_task_age` from the
-    database.
+    database, `batch_size` tasks at a time, sleeping for `batch_delay`
+    seconds between batches.
+
+    When the tasks table is partitioned, this also creates upcoming
+    partitions.  When task stats are enabled, this also deletes the
+    stats older than ``DRAMATIQ_TASKS_STATS["RETENTION"]``.
     """
-    from .models import Task
+    from .models import DATABASE_LABEL, Task, TaskStats
+
+    partitioning = get_partitioning_settings()
+    if partitioning:
+        try:
+            create_partitions(
+                connections[DATABASE_LABEL],
+                Task,
+                interval=partitioning["INTERVAL"],
+                count=partitioning["PREMAKE"],
+            )
+        except DatabaseError:
+            # Old Tasks must still be pruned.  Meanwhile, new Tasks land
+            # in the default partition, and are moved out of it once
+            # their partition gets created.
+            LOGGER.exception("Failed to create upcoming Task partitions.")
+
+    Task.tasks.delete_old_tasks(max_task_age, batch_size=batch_size, batch_delay=batch_delay)
 
-    Task.tasks.delete_old_tasks(max_task_age)
+    stats_settings = DjangoDramatiqConfig.tasks_stats_settings()
+    if stats_settings:
+        TaskStats.stats.delete_old_stats(stats_settings.get("RETENTION", DEFAULT_STATS_RETENTION))
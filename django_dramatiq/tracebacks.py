@@ -0,0 +1,106 @@
+"""Capture of the tracebacks of failed tasks.
+
+Tracebacks are fingerprinted by exception type and the code locations
+of their frames, which is cheap compared to formatting them.  A
+traceback is only formatted the first time its fingerprint is seen
+within a time window, so a storm of identical failures doesn't format
+and store the same text thousands of times.
+"""
+
+import hashlib
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+#: The default max number of frames to format.
+DEFAULT_MAX_FRAMES = 30
+
+#: The default max number of characters of a formatted traceback.
+DEFAULT_MAX_SIZE = 10000
+
+#: The default number of seconds during which tracebacks with the same
+#: fingerprint are only formatted once.
+DEFAULT_DEDUP_TTL = 60
+
+#: The default number of fingerprints remembered for deduplication.
+DEFAULT_DEDUP_CACHE_SIZE = 1000
+
+TRUNCATED_MARKER = "[...truncated...]\n"
+
+
+def get_fingerprint(exception):
+    """Get a hash of the type of `exception` and of the code locations
+    its traceback goes through.  Exceptions raised from the same place
+    have the same fingerprint, regardless of their message.
+    """
+    exception_type = type(exception)
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update(f"{exception_type.__module__}.{exception_type.__qualname__}".encode())
+    for frame, lineno in traceback.walk_tb(exception.__traceback__):
+        fingerprint.update(f"\n{frame.f_code.co_filename}:{frame.f_code.co_name}:{lineno}".encode())
+    return fingerprint.hexdigest()
+
+
+class TracebackCapture:
+    """Formats the tracebacks of exceptions, deduplicating them by
+    fingerprint.
+
+    Parameters:
+      enabled(bool): When False, tracebacks are fingerprinted but never
+        formatted.
+      max_frames(int): The max number of frames to format.
+      max_size(int): The max number of characters to keep.  Longer
+        tracebacks keep their last `max_size` characters.
+      dedup_ttl(float): The number of seconds during which tracebacks
+        with the same fingerprint are only formatted once.
+      dedup_cache_size(int): The max number of fingerprints to remember.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled=True,
+        max_frames=DEFAULT_MAX_FRAMES,
+        max_size=DEFAULT_MAX_SIZE,
+        dedup_ttl=DEFAULT_DEDUP_TTL,
+        dedup_cache_size=DEFAULT_DEDUP_CACHE_SIZE,
+    ):
+        self.enabled = enabled
+        self.max_frames = max_frames
+        self.max_size = max_size
+        self.dedup_ttl = dedup_ttl
+        self.dedup_cache_size = dedup_cache_size
+
+        self.lock = threading.Lock()
+        self.seen = OrderedDict()
+
+    def capture(self, exception):
+        """Get the fingerprint of `exception` and its formatted
+        traceback.  The traceback is None when capture is disabled or
+        when the fingerprint was captured less than `dedup_ttl`
+        seconds ago.
+        """
+        fingerprint = get_fingerprint(exception)
+        if not self.enabled or self._is_duplicate(fingerprint):
+            return fingerprint, None
+
+        formatted = "".join(
+            traceback.format_exception(type(exception), exception, exception.__traceback__, limit=self.max_frames)
+        )
+        if len(formatted) > self.max_size:
+            formatted = TRUNCATED_MARKER + formatted[-self.max_size :]
+        return fingerprint, formatted
+
+    def _is_duplicate(self, fingerprint):
+        current_time = time.monotonic()
+        with self.lock:
+            seen_at = self.seen.get(fingerprint)
+            if seen_at is not None and current_time - seen_at < self.dedup_ttl:
+                return True
+
+            self.seen[fingerprint] = current_time
+            self.seen.move_to_end(fingerprint)
+            while len(self.seen) > self.dedup_cache_size:
+                self.seen.popitem(last=False)
+            return False
@@ -0,0 +1,100 @@
+"""Helpers for enqueueing messages once the current database
+transaction commits.
+
+Messages enqueued inside a transaction are buffered in a single
+``on_commit`` callback per transaction, and are published back-to-back
+when it commits, with their Tasks written in bulk.  They're dropped if
+the transaction, or the savepoint they were enqueued in, is rolled
+back.  Outside of a transaction, messages are enqueued immediately.
+"""
+
+import dramatiq
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .bulk import DEFAULT_BATCH_SIZE, defer_task_writes
+
+
+class MessageBatch:
+    """An ``on_commit`` callback that enqueues a batch of messages."""
+
+    def __init__(self):
+        self.messages = []
+
+    def add(self, broker, message, delay=None):
+        self.messages.append((broker, message, delay))
+
+    def __call__(self):
+        messages, self.messages = self.messages, []
+        for start in range(0, len(messages), DEFAULT_BATCH_SIZE):
+            with defer_task_writes():
+                for broker, message, delay in messages[start : start + DEFAULT_BATCH_SIZE]:
+                    broker.enqueue(message, delay=delay)
+
+
+def get_batch(connection):
+    """Get the batch new messages should be added to, registering a
+    new one with the transaction if needed.
+
+    The last registered batch is only reused while it's also the last
+    ``on_commit`` callback of the transaction and was registered under
+    the same savepoints.  That keeps messages ordered with respect to
+    other callbacks, and lets savepoint rollbacks drop exactly the
+    messages enqueued within them.
+    """
+    if connection.run_on_commit:
+        savepoint_ids, callback, _ = connection.run_on_commit[-1]
+        if isinstance(callback, MessageBatch) and savepoint_ids == set(connection.savepoint_ids):
+            return callback
+
+    batch = MessageBatch()
+    connection.on_commit(batch)
+    return batch
+
+
+def enqueue_on_commit(message, *, delay=None, using=None, broker=None):
+    """Enqueue `message` once the current transaction on the `using`
+    database commits.
+
+    Parameters:
+      message(Message): The message to enqueue.
+      delay(int): The minimum amount of time, in milliseconds, the
+        message should be delayed by.
+      using(str): The alias of the database whose transaction to wait
+        for.  Defaults to the default database.
+      broker(Broker): The broker to enqueue the message on.  Defaults
+        to the global broker.
+
+    Returns:
+      Message: The message.
+    """
+    if broker is None:
+        broker = dramatiq.get_broker()
+
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if not connection.in_atomic_block:
+        broker.enqueue(message, delay=delay)
+        return message
+
+    get_batch(connection).add(broker, message, delay)
+    return message
+
+
+def send_on_commit(actor, *args, **kwargs):
+    """Send a message to `actor` once the current transaction on the
+    default database commits.
+
+    Returns:
+      Message: The message.
+    """
+    return enqueue_on_commit(actor.message(*args, **kwargs), broker=actor.broker)
+
+
+def send_with_options_on_commit(actor, *, args=(), kwargs=None, delay=None, using=None, **options):
+    """Send a message to `actor` once the current transaction on the
+    `using` database commits.  Like ``Actor.send_with_options``.
+
+    Returns:
+      Message: The message.
+    """
+    message = actor.message_with_options(args=args, kwargs=kwargs, **options)
+    return enqueue_on_commit(message, delay=delay, using=using, broker=actor.broker)
@@ -25,6 +25,7 @@ setup(
     long_description="Visit https://github.com/Bogdanp/django_dramatiq for more information.",
     packages=[
         "django_dramatiq",
+        "django_dramatiq.backends",
         "django_dramatiq.management",
         "django_dramatiq.management.commands",
         "django_dramatiq.migrations",
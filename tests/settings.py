@@ -59,7 +59,6 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
-                "common.context_processors.settings",
             ],
         },
     },
@@ -79,6 +78,15 @@ DATABASES = {
     }
 }
 
+# Set DRAMATIQ_TEST_POSTGRES to the name of a PostgreSQL database to run
+# the tests that need one.  Connection parameters are read from the
+# standard PG* environment variables.
+if os.getenv("DRAMATIQ_TEST_POSTGRES"):
+    DATABASES["postgres"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["DRAMATIQ_TEST_POSTGRES"],
+    }
+
 
 # Queue
 # =====
@@ -117,3 +125,5 @@ LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
 USE_TZ = True
+
+STATIC_URL = "/static/"
@@ -0,0 +1,187 @@
+import uuid
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from django.contrib import admin
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode
+from dramatiq import Message
+
+from django_dramatiq.admin import TaskAdmin
+from django_dramatiq.models import Task, TaskFailure
+from django_dramatiq.paginator import EstimatedCountPaginator
+
+
+def test_task_admin_eta_falls_back_to_the_message(db):
+    # Given a Task stored before its eta was denormalized
+    message = Message("default", "do_work", (), {}, {"eta": 1500000000000})
+    task = Task.tasks.create_or_update_from_message(message, status=Task.STATUS_DELAYED)
+    assert task.eta is None
+
+    # Then the admin should read the eta from the message
+    task_admin = TaskAdmin(Task, admin.site)
+    assert task_admin.eta(task) == datetime(2017, 7, 14, 2, 40, tzinfo=timezone.utc)
+
+    # When the eta is denormalized
+    task.eta = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    # Then the admin should read it from the column
+    assert task_admin.eta(task) == task.eta
+
+
+def test_task_admin_changelist_does_not_load_message_data(admin_client):
+    # Given a couple of Tasks
+    for _ in range(2):
+        message = Message("default", "do_work", (), {"payload": "x" * 1024}, {})
+        Task.tasks.create_or_update_from_message(message, status=Task.STATUS_DONE, actor_name="do_work")
+
+    # When I view the Task changelist
+    with CaptureQueriesContext(connection) as queries:
+        response = admin_client.get(reverse("admin:django_dramatiq_task_changelist"))
+
+    # Then the Tasks should be listed without selecting their payload
+    assert response.status_code == 200
+    assert response.context["cl"].result_count == 2
+    assert not any("message_data" in query["sql"] for query in queries)
+
+
+def test_task_admin_change_view_shows_message_details(admin_client):
+    # Given a Task
+    message = Message("default", "do_work", (), {"x": 1}, {})
+    task = Task.tasks.create_or_update_from_message(message, status=Task.STATUS_DONE)
+
+    # When I view it
+    response = admin_client.get(reverse("admin:django_dramatiq_task_change", args=(task.pk,)))
+
+    # Then its message should be shown
+    assert response.status_code == 200
+    assert b"do_work" in response.content
+
+
+def test_estimated_count_paginator_uses_exact_counts_outside_postgres(db):
+    paginator = EstimatedCountPaginator(Task.tasks.all(), 10)
+    assert paginator.estimate_count() is None
+    assert paginator.count == 0
+
+
+@pytest.mark.parametrize(
+    "plan",
+    (
+        # psycopg decodes json columns.
+        [{"Plan": {"Node Type": "Seq Scan", "Plan Rows": 2000000}}],
+        '[{"Plan": {"Node Type": "Seq Scan", "Plan Rows": 2000000}}]',
+    ),
+)
+def test_estimated_count_paginator_reads_the_planner_estimate(db, plan):
+    # Given a PostgreSQL connection whose planner estimates two million rows
+    paginator = EstimatedCountPaginator(Task.tasks.filter(status=Task.STATUS_DONE), 10)
+    cursor = mock.MagicMock()
+    cursor.__enter__.return_value.fetchone.return_value = (plan,)
+    with (
+        mock.patch.object(connection, "vendor", "postgresql"),
+        mock.patch.object(connection, "cursor", return_value=cursor),
+    ):
+        # Then the paginator should use the estimate
+        assert paginator.estimate_count() == 2000000
+
+    sql = cursor.__enter__.return_value.execute.call_args.args[0]
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+
+
+def test_estimated_count_paginator_uses_large_estimates():
+    queryset = mock.MagicMock()
+    paginator = EstimatedCountPaginator(queryset, 10)
+    with mock.patch.object(EstimatedCountPaginator, "estimate_count", return_value=2000000):
+        assert paginator.count == 2000000
+        queryset.count.assert_not_called()
+
+
+def test_task_admin_can_paginate_with_a_cursor(admin_client, monkeypatch):
+    # Given a Task admin that uses keyset pagination, two Tasks per page
+    task_admin = admin.site._registry[Task]
+    monkeypatch.setattr(task_admin, "keyset_pagination", True)
+    monkeypatch.setattr(task_admin, "list_per_page", 2)
+
+    # And five Tasks
+    for _ in range(5):
+        Task.tasks.create_or_update_from_message(Message("default", "do_work", (), {}, {}), status=Task.STATUS_DONE)
+    expected_ids = list(Task.tasks.order_by("-updated_at", "-id").values_list("id", flat=True))
+
+    # When I walk through the changelist's pages
+    seen_ids, url = [], reverse("admin:django_dramatiq_task_changelist")
+    while True:
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        cl = response.context["cl"]
+        seen_ids += [task.id for task in cl.result_list]
+        if not cl.next_page_url:
+            break
+        assert b"Next page" in response.content
+        url = reverse("admin:django_dramatiq_task_changelist") + cl.next_page_url
+
+    # Then every Task should be listed exactly once, in order
+    assert seen_ids == expected_ids
+    assert cl.first_page_url == "?"
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    (
+        "nope",
+        # Well-formed, but without a date.
+        urlsafe_base64_encode(f"nope|{uuid.uuid4()}".encode()),
+    ),
+)
+def test_task_admin_rejects_invalid_cursors(admin_client, monkeypatch, cursor):
+    monkeypatch.setattr(admin.site._registry[Task], "keyset_pagination", True)
+
+    response = admin_client.get(reverse("admin:django_dramatiq_task_changelist") + f"?cursor={cursor}")
+
+    assert response.status_code == 302
+    assert response.url.endswith("?e=1")
+
+
+def test_task_failure_admin_lists_aggregated_failures(admin_client):
+    # Given a failure that happened twice
+    message_ids = [uuid.uuid4(), uuid.uuid4()]
+    for message_id in message_ids:
+        TaskFailure.failures.record_failure(
+            "f" * 32,
+            message_id=message_id,
+            actor_name="do_work",
+            exception_type="RuntimeError",
+            failure_reason="RuntimeError: failed",
+        )
+
+    # Then a single aggregate should count both failures
+    failure = TaskFailure.failures.get()
+    assert failure.count == 2
+    assert failure.sample_message_id == message_ids[-1]
+    assert failure.first_seen <= failure.last_seen
+
+    # When I view the failures changelist
+    response = admin_client.get(reverse("admin:django_dramatiq_taskfailure_changelist"))
+
+    # Then the aggregate should be listed
+    assert response.status_code == 200
+    assert "RuntimeError: failed" in response.content.decode()
+
+    # And its tasks should be reachable from the Task changelist
+    response = admin_client.get(reverse("admin:django_dramatiq_task_changelist"), {"traceback_fingerprint": "f" * 32})
+    assert response.status_code == 200
+
+
+def test_task_admin_can_filter_the_changelist(admin_client):
+    # Given a done Task and a failed one
+    done = Task.tasks.create_or_update_from_message(Message("default", "do_work", (), {}, {}), status=Task.STATUS_DONE)
+    Task.tasks.create_or_update_from_message(Message("default", "do_work", (), {}, {}), status=Task.STATUS_FAILED)
+
+    # When I filter the changelist by status
+    response = admin_client.get(reverse("admin:django_dramatiq_task_changelist"), {"status__exact": "done"})
+
+    # Then only the done Task should be listed
+    assert response.status_code == 200
+    assert [str(task.id) for task in response.context["cl"].result_list] == [done.id]
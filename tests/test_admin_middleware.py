@@ -1,11 +1,15 @@
+import time
+import uuid
 from threading import Event
 
 import dramatiq
 import pytest
-from dramatiq import Middleware
+from dramatiq import Message, Middleware
 from dramatiq.middleware import SkipMessage
 
-from django_dramatiq.models import Task
+from django_dramatiq.buffer import TaskBuffer
+from django_dramatiq.middleware import AdminMiddleware
+from django_dramatiq.models import Task, TaskFailure
 
 
 def test_admin_middleware_keeps_track_of_tasks(transactional_db, broker, worker):
@@ -54,7 +58,7 @@ def test_admin_middleware_keeps_track_of_failed_tasks(transactional_db, broker,
     task = Task.tasks.get()
     assert task
     assert task.status == Task.STATUS_FAILED
-    assert "RuntimeError" in task.message.options["traceback"]
+    assert "RuntimeError" in task.traceback
 
 
 def test_admin_middleware_keeps_track_of_skipped_tasks(transactional_db, broker, worker):
@@ -82,3 +86,422 @@ def test_admin_middleware_keeps_track_of_skipped_tasks(transactional_db, broker,
     task = Task.tasks.get()
     assert task
     assert task.status == Task.STATUS_SKIPPED
+
+
+def test_admin_middleware_can_buffer_task_updates(transactional_db, broker, worker, settings):
+    # Given an AdminMiddleware that buffers its writes
+    settings.DRAMATIQ_TASKS_BUFFER = {"MAX_SIZE": 100, "FLUSH_INTERVAL": 60}
+    admin_middleware = AdminMiddleware()
+    broker.middleware[:] = [admin_middleware if isinstance(m, AdminMiddleware) else m for m in broker.middleware]
+
+    # And an actor
+    @dramatiq.actor
+    def do_work():
+        pass
+
+    # When I send it a message and join on the broker
+    do_work.send()
+    broker.join(do_work.queue_name, fail_fast=True)
+    worker.join()
+
+    # Then no Task should have been written yet
+    assert Task.tasks.count() == 0
+
+    # When I flush the buffer
+    admin_middleware.buffer.close()
+
+    # Then a single finished Task should be stored to the database
+    task = Task.tasks.get()
+    assert task.status == Task.STATUS_DONE
+    assert task.actor_name == "do_work"
+
+
+def test_task_buffer_flushes_when_full(transactional_db):
+    # Given a buffer that flushes every two updates
+    buffer = TaskBuffer(max_size=2, flush_interval=60)
+
+    # When I add two updates for different messages
+    first, second = Message("default", "do_work", (), {}, {}), Message("default", "do_work", (), {}, {})
+    buffer.add(first, status=Task.STATUS_ENQUEUED)
+    buffer.add(second, status=Task.STATUS_ENQUEUED)
+
+    # Then both Tasks should eventually be stored to the database
+    for _ in range(100):
+        if Task.tasks.count() == 2:
+            break
+        time.sleep(0.05)
+
+    buffer.close()
+    assert Task.tasks.count() == 2
+
+
+def test_task_buffer_coalesces_updates(transactional_db):
+    # Given a buffer
+    buffer = TaskBuffer(max_size=100, flush_interval=60, coalesce_window=60)
+
+    # When a message goes through its whole lifecycle
+    message = Message("default", "do_work", (), {}, {})
+    assert buffer.add(message, status=Task.STATUS_ENQUEUED)
+    assert buffer.add(message, status=Task.STATUS_RUNNING)
+    assert buffer.add(message, status=Task.STATUS_DONE)
+
+    # And a late running update comes in
+    assert not buffer.add(message, status=Task.STATUS_RUNNING)
+
+    # Then only the final status should be pending
+    assert len(buffer.pending) == 1
+
+    # When I flush the buffer
+    buffer.flush()
+
+    # Then the Task should be stored with its final status
+    assert Task.tasks.get().status == Task.STATUS_DONE
+
+
+def test_task_buffer_holds_back_messages_in_non_final_statuses(transactional_db):
+    # Given a buffer
+    buffer = TaskBuffer(max_size=100, flush_interval=60, coalesce_window=60)
+
+    # And a running message and a finished one
+    running, done = Message("default", "do_work", (), {}, {}), Message("default", "do_work", (), {}, {})
+    buffer.add(running, status=Task.STATUS_RUNNING)
+    buffer.add(done, status=Task.STATUS_DONE)
+
+    # When the buffer is flushed without being forced
+    buffer.flush(force=False)
+
+    # Then only the finished message should be stored
+    assert Task.tasks.get().id.hex == done.message_id.replace("-", "")
+    assert list(buffer.pending) == [running.message_id]
+    buffer.close()
+
+
+def test_task_buffer_accepts_updates_for_retried_messages(transactional_db):
+    # Given a buffer
+    buffer = TaskBuffer(max_size=100, flush_interval=60)
+
+    # When a message fails and is then retried
+    message = Message("default", "do_work", (), {}, {})
+    buffer.add(message, status=Task.STATUS_FAILED)
+    retried = message.copy(options={"retries": 1})
+
+    # Then updates for the new attempt should replace the failure
+    assert buffer.add(retried, status=Task.STATUS_ENQUEUED)
+    buffer.flush()
+    assert Task.tasks.get().status == Task.STATUS_ENQUEUED
+
+
+def test_task_buffer_writes_updates_as_they_were_added(transactional_db):
+    # Given a buffer
+    buffer = TaskBuffer(max_size=100, flush_interval=60)
+
+    # When a message fails, and its options are then changed for the
+    # retry, like the Retries middleware does, before the buffer flushes
+    message = Message("default", "do_work", (), {}, {})
+    buffer.add(message, status=Task.STATUS_FAILED, retries=0)
+    message.options["retries"] = 1
+    buffer.flush()
+
+    # Then the failure should be stored for the attempt that failed
+    task = Task.tasks.get()
+    assert task.retries == 0
+    assert task.message.options == {}
+
+    # And the retry's updates should still apply
+    buffer.add(message, status=Task.STATUS_ENQUEUED, retries=1)
+    buffer.flush()
+    task.refresh_from_db()
+    assert (task.status, task.retries) == (Task.STATUS_ENQUEUED, 1)
+
+
+def test_task_buffer_writes_message_data_when_any_update_requires_it(transactional_db):
+    # Given a buffer
+    buffer = TaskBuffer(max_size=100, flush_interval=60)
+
+    # And a Task for a message that was stored before it was retried
+    message = Message("default", "do_work", (), {}, {})
+    Task.tasks.create_or_update_from_message(message, status=Task.STATUS_FAILED)
+    retried = message.copy(options={"retries": 1})
+
+    # When the retry is enqueued and starts running
+    buffer.add(retried, status=Task.STATUS_ENQUEUED)
+    buffer.add(retried, status_only=True, status=Task.STATUS_RUNNING)
+    buffer.flush()
+
+    # Then the Task's message data should include the new options
+    task = Task.tasks.get()
+    assert task.status == Task.STATUS_RUNNING
+    assert task.message.options == {"retries": 1}
+
+
+def test_admin_middleware_denormalizes_message_fields(transactional_db, broker):
+    # Given an AdminMiddleware
+    admin_middleware = AdminMiddleware()
+
+    # When a delayed message that's being retried gets enqueued
+    message = Message("default", "do_work", (), {}, {"eta": 1500000000000, "retries": 2})
+    admin_middleware.after_enqueue(broker, message, 1000)
+
+    # Then its eta and retries should be stored on the Task
+    task = Task.tasks.get()
+    assert task.eta.timestamp() == 1500000000
+    assert task.retries == 2
+
+    # When the message fails
+    admin_middleware.after_process_message(broker, message, exception=RuntimeError("failed"))
+
+    # Then the reason should be stored on the Task
+    task.refresh_from_db()
+    assert task.status == Task.STATUS_FAILED
+    assert task.failure_reason == "RuntimeError: failed"
+    assert task.eta.timestamp() == 1500000000
+
+
+def test_admin_middleware_can_include_and_exclude_actors(transactional_db, broker, settings):
+    # Given an AdminMiddleware that only tracks some actors
+    settings.DRAMATIQ_TASKS_TRACKING = {
+        "INCLUDE_ACTORS": ["do_work", "do_other_work"],
+        "EXCLUDE_ACTORS": ["do_other_work"],
+    }
+    admin_middleware = AdminMiddleware()
+
+    # When messages for included, excluded and unlisted actors are enqueued
+    for actor_name in ("do_work", "do_other_work", "do_nothing"):
+        admin_middleware.after_enqueue(broker, Message("default", actor_name, (), {}, {}), None)
+
+    # Then only the included actor's Task should be stored
+    assert list(Task.tasks.values_list("actor_name", flat=True)) == ["do_work"]
+
+
+def test_admin_middleware_can_sample_tasks(transactional_db, broker, settings):
+    # Given an AdminMiddleware that samples a tenth of one actor's messages
+    settings.DRAMATIQ_TASKS_TRACKING = {"ACTOR_SAMPLE_RATES": {"do_work": 0.1}}
+    admin_middleware = AdminMiddleware()
+
+    # When many messages go through their whole lifecycle
+    for _ in range(500):
+        message = Message("default", "do_work", (), {}, {})
+        admin_middleware.after_enqueue(broker, message, None)
+        admin_middleware.before_process_message(broker, message)
+        admin_middleware.after_process_message(broker, message)
+
+    # Then roughly a tenth of them should be stored, all of them finished
+    assert 20 <= Task.tasks.count() <= 80
+    assert not Task.tasks.exclude(status=Task.STATUS_DONE).exists()
+
+    # And other actors should still be fully tracked
+    admin_middleware.after_enqueue(broker, Message("default", "do_other_work", (), {}, {}), None)
+    assert Task.tasks.filter(actor_name="do_other_work").exists()
+
+
+def test_admin_middleware_always_tracks_failures_and_retries(transactional_db, broker, settings):
+    # Given an AdminMiddleware that samples out every message
+    settings.DRAMATIQ_TASKS_TRACKING = {"QUEUE_SAMPLE_RATES": {"default": 0}}
+    admin_middleware = AdminMiddleware()
+
+    # When a message is enqueued and fails
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.after_process_message(broker, message, exception=RuntimeError("failed"))
+
+    # Then the failure should be stored
+    task = Task.tasks.get()
+    assert task.status == Task.STATUS_FAILED
+
+    # When the message is retried and succeeds
+    retried = message.copy(options={"retries": 1})
+    admin_middleware.after_enqueue(broker, retried, None)
+    admin_middleware.after_process_message(broker, retried)
+
+    # Then the retry should be tracked too
+    task.refresh_from_db()
+    assert task.status == Task.STATUS_DONE
+    assert task.retries == 1
+
+
+def test_admin_middleware_does_not_store_the_tracebacks_of_retried_messages(transactional_db, broker):
+    # Given an AdminMiddleware
+    admin_middleware = AdminMiddleware()
+
+    # When a message fails
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.after_process_message(broker, message, exception=RuntimeError("failed"))
+
+    # And is retried with its traceback, like the Retries middleware does
+    retried = message.copy(options={"retries": 1, "traceback": "Traceback (most recent call last): ..."})
+    admin_middleware.after_enqueue(broker, retried, None)
+
+    # Then the traceback should only be stored in its own column
+    task = Task.tasks.get()
+    assert task.message.options == {"retries": 1}
+    assert "RuntimeError: failed" in task.get_traceback()
+    assert "traceback" in retried.options
+
+
+def test_admin_middleware_can_track_failures_only(transactional_db, broker, settings):
+    # Given an AdminMiddleware that only tracks failures on one queue
+    settings.DRAMATIQ_TASKS_TRACKING = {"FAILURES_ONLY": ["default"]}
+    admin_middleware = AdminMiddleware()
+
+    # When messages on that queue succeed, fail and get skipped
+    succeeded, failed, skipped = (Message("default", "do_work", (), {}, {}) for _ in range(3))
+    for message in (succeeded, failed, skipped):
+        admin_middleware.after_enqueue(broker, message, None)
+        admin_middleware.before_process_message(broker, message)
+
+    # Then nothing should be stored until they finish
+    assert not Task.tasks.exists()
+
+    admin_middleware.after_process_message(broker, succeeded)
+    admin_middleware.after_process_message(broker, failed, exception=RuntimeError("failed"))
+    admin_middleware.after_skip_message(broker, skipped)
+
+    # And only the failed and skipped messages should be stored
+    assert dict(Task.tasks.values_list("id", "status")) == {
+        uuid.UUID(failed.message_id): Task.STATUS_FAILED,
+        uuid.UUID(skipped.message_id): Task.STATUS_SKIPPED,
+    }
+    assert Task.tasks.get(status=Task.STATUS_FAILED).actor_name == "do_work"
+
+    # When a message on another queue is enqueued
+    admin_middleware.after_enqueue(broker, Message("reports", "do_work", (), {}, {}), None)
+
+    # Then it should be tracked as usual
+    assert Task.tasks.filter(queue_name="reports").exists()
+
+
+def test_admin_middleware_stores_tracebacks_outside_of_messages(transactional_db, broker):
+    # Given an AdminMiddleware
+    admin_middleware = AdminMiddleware()
+
+    # When two messages fail in the same way
+    first, second = Message("default", "do_work", (), {}, {}), Message("default", "do_work", (), {}, {})
+    for message in (first, second):
+        try:
+            raise RuntimeError("failed")
+        except RuntimeError as e:
+            exception = e
+        admin_middleware.after_process_message(broker, message, exception=exception)
+
+    # Then the traceback should be stored in its own column, once
+    first_task, second_task = Task.tasks.get(pk=first.message_id), Task.tasks.get(pk=second.message_id)
+    assert "RuntimeError: failed" in first_task.traceback
+    assert second_task.traceback is None
+    assert first_task.traceback_fingerprint == second_task.traceback_fingerprint
+    assert "traceback" not in second_task.message.options
+
+    # And both Tasks should expose it
+    assert second_task.get_traceback() == first_task.traceback
+
+
+def test_admin_middleware_aggregates_failures(transactional_db, broker):
+    # Given an AdminMiddleware
+    admin_middleware = AdminMiddleware()
+
+    # When the same actor fails in the same way three times
+    messages = [Message("default", "do_work", (), {}, {}) for _ in range(3)]
+    for message in messages:
+        try:
+            raise ValueError(f"failed {message.message_id}")
+        except ValueError as e:
+            admin_middleware.after_process_message(broker, message, exception=e)
+
+    # Then the failures should be aggregated by fingerprint
+    failure = TaskFailure.failures.get()
+    assert failure.count == 3
+    assert failure.actor_name == "do_work"
+    assert failure.exception_type == "ValueError"
+    assert str(failure.sample_message_id) == messages[-1].message_id
+    assert failure.fingerprint == Task.tasks.get(pk=messages[0].message_id).traceback_fingerprint
+
+
+@pytest.mark.parametrize("buffered", (False, True))
+def test_admin_middleware_records_timings(transactional_db, broker, settings, buffered):
+    # Given an AdminMiddleware
+    if buffered:
+        settings.DRAMATIQ_TASKS_BUFFER = {"FLUSH_INTERVAL": 60}
+    admin_middleware = AdminMiddleware()
+
+    # When a message goes through its whole lifecycle
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.before_process_message(broker, message)
+    admin_middleware.after_process_message(broker, message)
+    if buffered:
+        admin_middleware.buffer.close()
+
+    # Then its Task should record when it was enqueued, started and finished
+    task = Task.tasks.get()
+    assert task.enqueued_at <= task.started_at <= task.finished_at
+    assert task.latency.total_seconds() >= 0
+    assert task.runtime.total_seconds() >= 0
+
+
+def test_admin_middleware_buffers_in_separate_processes_never_regress_tasks(transactional_db, broker, settings):
+    # Given a producer and a worker whose AdminMiddlewares buffer their updates
+    settings.DRAMATIQ_TASKS_BUFFER = {"FLUSH_INTERVAL": 60, "COALESCE_WINDOW": 60}
+    producer, worker = AdminMiddleware(), AdminMiddleware()
+
+    # When the producer's enqueued update is held back while the worker runs the message
+    message = Message("default", "do_work", (), {}, {})
+    producer.after_enqueue(broker, message, None)
+    worker.before_process_message(broker, message)
+    worker.after_process_message(broker, message)
+    worker.buffer.close()
+
+    # And the producer's update is flushed last
+    producer.buffer.close()
+
+    # Then the Task should stay done
+    task = Task.tasks.get()
+    assert task.status == Task.STATUS_DONE
+    assert task.finished_at is not None
+
+
+def test_admin_middleware_clears_the_previous_finish_time_on_retries(transactional_db, broker):
+    # Given an AdminMiddleware and a message whose first attempt failed
+    admin_middleware = AdminMiddleware()
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.before_process_message(broker, message)
+    admin_middleware.after_process_message(broker, message, exception=RuntimeError("failed"))
+    assert Task.tasks.get().finished_at is not None
+
+    # When its retry starts
+    retried = message.copy(options={"retries": 1})
+    admin_middleware.before_process_message(broker, retried)
+
+    # Then the Task shouldn't keep the previous attempt's finish time
+    task = Task.tasks.get()
+    assert task.status == Task.STATUS_RUNNING
+    assert task.finished_at is None
+    assert task.runtime is None
+
+
+def test_admin_middleware_buffers_failure_counts(transactional_db, broker, settings):
+    # Given an AdminMiddleware that buffers its updates
+    settings.DRAMATIQ_TASKS_BUFFER = {"FLUSH_INTERVAL": 60}
+    admin_middleware = AdminMiddleware()
+
+    # When a few messages fail the same way
+    def fail():
+        raise ValueError("failed")
+
+    messages = [Message("default", "do_work", (), {}, {}) for _ in range(3)]
+    for message in messages:
+        try:
+            fail()
+        except ValueError as e:
+            admin_middleware.after_process_message(broker, message, exception=e)
+
+    # Then nothing should be written to the failure aggregate until a flush
+    assert not TaskFailure.failures.exists()
+
+    # When the buffer is flushed
+    admin_middleware.buffer.close()
+
+    # Then their failures should be counted at once
+    failure = TaskFailure.failures.get()
+    assert failure.count == 3
+    assert str(failure.sample_message_id) == messages[-1].message_id
@@ -0,0 +1,72 @@
+import base64
+import json
+
+from dramatiq import Message
+
+from django_dramatiq.backends import LogFileBackend, MemoryBackend, ORMBackend, load_backend
+from django_dramatiq.buffer import TaskBuffer
+from django_dramatiq.middleware import AdminMiddleware
+from django_dramatiq.models import Task
+
+
+def test_load_backend_defaults_to_the_orm(settings):
+    settings.DRAMATIQ_TASKS_BACKEND = {}
+    assert isinstance(load_backend(), ORMBackend)
+
+
+def test_admin_middleware_can_use_the_memory_backend(db, broker, settings):
+    # Given an AdminMiddleware that stores Tasks in memory
+    settings.DRAMATIQ_TASKS_BACKEND = {
+        "BACKEND": "django_dramatiq.backends.MemoryBackend",
+        "BACKEND_OPTIONS": {"max_size": 2},
+    }
+    admin_middleware = AdminMiddleware()
+
+    # When a message goes through its whole lifecycle
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.before_process_message(broker, message)
+    admin_middleware.after_process_message(broker, message)
+
+    # Then its Task should be stored in memory rather than in the database
+    task = admin_middleware.backend.get(message.message_id)
+    assert task["status"] == Task.STATUS_DONE
+    assert task["actor_name"] == "do_work"
+    assert task["message"] is message
+    assert not Task.tasks.exists()
+
+
+def test_memory_backend_evicts_the_least_recently_updated_tasks():
+    # Given a memory backend that holds two Tasks
+    backend = MemoryBackend(max_size=2)
+    first, second, third = (Message("default", "do_work", (), {}, {}) for _ in range(3))
+
+    # When three messages are stored, and the first one is updated
+    backend.create_or_update_from_message(first, status=Task.STATUS_ENQUEUED)
+    backend.create_or_update_from_message(second, status=Task.STATUS_ENQUEUED)
+    backend.update_status_from_message(first, Task.STATUS_RUNNING)
+    backend.create_or_update_from_message(third, status=Task.STATUS_ENQUEUED)
+
+    # Then the second one should have been evicted
+    assert len(backend) == 2
+    assert backend.get(second.message_id) is None
+    assert backend.get(first.message_id)["status"] == Task.STATUS_RUNNING
+
+
+def test_log_file_backend_appends_updates(tmp_path):
+    # Given a log file backend behind a buffer
+    path = tmp_path / "tasks.log"
+    buffer = TaskBuffer(backend=LogFileBackend(path=str(path)), flush_interval=60)
+
+    # When a message is enqueued and then finishes
+    enqueued, done = Message("default", "do_work", (), {}, {}), Message("default", "do_work", (), {}, {})
+    buffer.add(enqueued, status=Task.STATUS_ENQUEUED)
+    buffer.add(done, status_only=True, status=Task.STATUS_DONE)
+    buffer.close()
+
+    # Then one line per update should be appended to the file
+    records = {record["id"]: record for record in map(json.loads, path.read_text().splitlines())}
+    assert records[enqueued.message_id]["status"] == Task.STATUS_ENQUEUED
+    assert base64.b64decode(records[enqueued.message_id]["message_data"]) == enqueued.encode()
+    assert records[done.message_id]["status"] == Task.STATUS_DONE
+    assert "message_data" not in records[done.message_id]
@@ -0,0 +1,130 @@
+import time
+from unittest import mock
+
+import dramatiq
+from django.db import OperationalError, transaction
+from dramatiq import Worker
+
+from django_dramatiq.bulk import send_many
+from django_dramatiq.models import Task
+from django_dramatiq.transaction import send_on_commit
+
+
+def test_send_many_writes_tasks_in_bulk(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def fan_out(x):
+        pass
+
+    # When many messages are sent to it in batches
+    with mock.patch.object(Task.tasks, "update_or_create") as update_or_create:
+        with mock.patch.object(
+            Task.tasks, "bulk_create_or_update_from_messages", wraps=Task.tasks.bulk_create_or_update_from_messages
+        ) as bulk_create_or_update:
+            messages = send_many((fan_out.message(x) for x in range(5)), batch_size=2)
+
+    # Then every message should be enqueued
+    assert [message.args for message in messages] == [(x,) for x in range(5)]
+    assert broker.queues[fan_out.queue_name].qsize() == 5
+
+    # And their Tasks should be written once per batch
+    update_or_create.assert_not_called()
+    assert bulk_create_or_update.call_count == 3
+    assert Task.tasks.filter(status=Task.STATUS_ENQUEUED, actor_name="fan_out").count() == 5
+
+
+def test_send_many_can_delay_messages(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def delayed_fan_out():
+        pass
+
+    # When messages are sent to it in bulk with a delay
+    send_many([delayed_fan_out.message(), delayed_fan_out.message()], delay=60000)
+
+    # Then their Tasks should be stored as delayed
+    assert Task.tasks.filter(status=Task.STATUS_DELAYED).count() == 2
+
+
+def test_send_many_enqueues_every_batch_when_tasks_cannot_be_written(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def untracked_fan_out(x):
+        pass
+
+    # When messages are sent to it in batches while Tasks can't be written
+    with mock.patch.object(
+        Task.tasks, "bulk_create_or_update_from_messages", side_effect=OperationalError("database is down")
+    ):
+        messages = send_many((untracked_fan_out.message(x) for x in range(3)), batch_size=1)
+
+    # Then every message should still be enqueued
+    assert len(messages) == 3
+    assert broker.queues[untracked_fan_out.queue_name].qsize() == 3
+
+
+def test_send_on_commit_enqueues_every_chunk_when_tasks_cannot_be_written(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def untracked_committed_fan_out(x):
+        pass
+
+    # When more messages than fit in a chunk are sent to it inside a
+    # transaction while Tasks can't be written
+    with mock.patch("django_dramatiq.transaction.DEFAULT_BATCH_SIZE", 1):
+        with mock.patch.object(
+            Task.tasks, "bulk_create_or_update_from_messages", side_effect=OperationalError("database is down")
+        ):
+            with transaction.atomic():
+                for x in range(3):
+                    send_on_commit(untracked_committed_fan_out, x)
+
+    # Then every message should still be enqueued once it commits
+    assert broker.queues[untracked_committed_fan_out.queue_name].qsize() == 3
+
+
+def test_send_on_commit_writes_tasks_in_bulk(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def committed_fan_out(x):
+        pass
+
+    # When messages are sent to it inside a transaction
+    with mock.patch.object(Task.tasks, "update_or_create") as update_or_create:
+        with transaction.atomic():
+            for x in range(3):
+                send_on_commit(committed_fan_out, x)
+
+    # Then their Tasks should be written in bulk once it commits
+    update_or_create.assert_not_called()
+    assert Task.tasks.filter(actor_name="committed_fan_out").count() == 3
+
+
+def test_send_many_does_not_overwrite_tasks_advanced_by_workers(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def concurrent_fan_out(x):
+        pass
+
+    # And a broker that's slow to publish, so workers run messages before their batch's Tasks are written
+    enqueue = broker.enqueue
+
+    def slow_enqueue(message, *, delay=None):
+        time.sleep(0.001)
+        return enqueue(message, delay=delay)
+
+    # When many messages are sent to it in bulk while a worker is running
+    # (a single thread, since SQLite only allows one writer at a time)
+    worker = Worker(broker, worker_threads=1, worker_timeout=100)
+    worker.start()
+    try:
+        with mock.patch.object(broker, "enqueue", slow_enqueue):
+            send_many((concurrent_fan_out.message(x) for x in range(100)), batch_size=50)
+
+        broker.join(concurrent_fan_out.queue_name, fail_fast=True)
+        worker.join()
+    finally:
+        worker.stop()
+
+    # Then every Task should end up done
+    assert Task.tasks.filter(actor_name="concurrent_fan_out", status=Task.STATUS_DONE).count() == 100
@@ -0,0 +1,44 @@
+import pytest
+from dramatiq import Message
+
+from django_dramatiq.compression import LZMA_MARKER, ZLIB_MARKER, compress, decompress
+from django_dramatiq.models import Task
+
+
+@pytest.mark.parametrize("algorithm, marker", (("zlib", ZLIB_MARKER), ("lzma", LZMA_MARKER)))
+def test_compress_round_trips_large_payloads(algorithm, marker):
+    data = b'{"kwargs": "' + b"a" * 4096 + b'"}'
+
+    compressed = compress(data, algorithm=algorithm, threshold=1024)
+
+    assert compressed.startswith(marker)
+    assert len(compressed) < len(data)
+    assert decompress(compressed) == data
+
+
+def test_compress_leaves_small_payloads_alone():
+    assert compress(b"{}", algorithm="zlib", threshold=1024) == b"{}"
+    assert decompress(b"{}") == b"{}"
+
+
+def test_compress_rejects_unknown_algorithms():
+    with pytest.raises(ValueError):
+        compress(b"a" * 10, algorithm="zstd", threshold=0)
+
+
+def test_tasks_decode_compressed_and_uncompressed_payloads(transactional_db, settings):
+    # Given a Task stored without compression
+    message = Message("default", "do_work", (), {"data": "a" * 4096}, {})
+    Task.tasks.create_or_update_from_message(message, status=Task.STATUS_ENQUEUED)
+    old_task = Task.tasks.get()
+    assert bytes(old_task.message_data) == message.encode()
+
+    # And a Task stored once compression was enabled
+    settings.DRAMATIQ_TASKS_COMPRESSION = {"ALGORITHM": "zlib", "THRESHOLD": 1024}
+    other_message = message.copy(message_id="00000000-0000-0000-0000-000000000001")
+    Task.tasks.create_or_update_from_message(other_message, status=Task.STATUS_ENQUEUED)
+    new_task = Task.tasks.get(id=other_message.message_id)
+    assert bytes(new_task.message_data).startswith(ZLIB_MARKER)
+
+    # Then both messages should be decoded transparently
+    assert old_task.message.kwargs == new_task.message.kwargs == {"data": "a" * 4096}
@@ -0,0 +1,68 @@
+from unittest import mock
+
+import dramatiq
+from django.db import connections
+from dramatiq import Message
+
+from django_dramatiq.middleware import DbConnectionsMiddleware
+from django_dramatiq.models import Task
+
+
+def process(broker, middleware, message, fn):
+    middleware.before_process_message(broker, message)
+    fn()
+    middleware.after_process_message(broker, message)
+
+
+def test_db_connections_middleware_only_cleans_up_used_connections(transactional_db, broker):
+    # Given a DbConnectionsMiddleware and an actor
+    middleware = DbConnectionsMiddleware()
+
+    @dramatiq.actor
+    def do_work():
+        pass
+
+    message = Message(do_work.queue_name, do_work.actor_name, (), {}, {})
+    with mock.patch.object(
+        type(connections["default"]), "close_if_unusable_or_obsolete"
+    ) as close_if_unusable_or_obsolete:
+        # When the thread has no open connection and the actor doesn't use the database
+        connections["default"].close()
+        process(broker, middleware, message, lambda: None)
+
+        # Then no connection should be checked
+        close_if_unusable_or_obsolete.assert_not_called()
+
+        # When the actor queries the database
+        process(broker, middleware, message, lambda: Task.tasks.count())
+
+        # Then its connection should be checked once it's done
+        close_if_unusable_or_obsolete.assert_called_once_with()
+
+
+def test_db_connections_middleware_can_be_disabled_per_actor(transactional_db, broker):
+    # Given a DbConnectionsMiddleware and an actor that opts out of it
+    middleware = DbConnectionsMiddleware()
+    broker.add_middleware(middleware)
+
+    @dramatiq.actor(close_old_connections=False)
+    def do_work():
+        pass
+
+    message = Message(do_work.queue_name, do_work.actor_name, (), {}, {})
+    with mock.patch.object(
+        type(connections["default"]), "close_if_unusable_or_obsolete"
+    ) as close_if_unusable_or_obsolete:
+        # When the actor queries the database
+        connections["default"].close()
+        process(broker, middleware, message, lambda: Task.tasks.count())
+
+        # Then its connection should be left alone once it's done
+        close_if_unusable_or_obsolete.assert_not_called()
+
+        # When the thread processes its next message
+        process(broker, middleware, message, lambda: None)
+
+        # Then the connection it has open should still be checked first,
+        # since other middleware use it too
+        close_if_unusable_or_obsolete.assert_called_once_with()
@@ -1,6 +1,9 @@
 import uuid
 from unittest import mock
 
+import pytest
+from django.utils.timezone import now
+
 from django_dramatiq.models import Task
 
 
@@ -8,6 +11,8 @@ def test_task_create_or_update_from_message(transactional_db, broker, worker):
     message = mock.Mock()
     message_id = uuid.uuid4()
     message.encode.return_value = b"{}"
+    message.message_timestamp = 1500000000000
+    message.options = {}
     message.message_id = message_id
 
     Task.tasks.create_or_update_from_message(message)
@@ -25,3 +30,122 @@ def test_task_create_or_update_from_message(transactional_db, broker, worker):
     message.encode.assert_called_once_with()
     assert Task.tasks.count() == 1
     assert t.message_data == message.encode.return_value
+
+
+def test_task_update_status_from_message(transactional_db):
+    message = mock.Mock()
+    message.message_id = uuid.uuid4()
+    message.encode.return_value = b"{}"
+    message.message_timestamp = 1500000000000
+    message.options = {}
+
+    # Creates the Task when it doesn't exist
+    Task.tasks.update_status_from_message(message, Task.STATUS_RUNNING, actor_name="do_work")
+    t = Task.tasks.get(pk=message.message_id)
+    message.encode.assert_called_once_with()
+    assert t.status == Task.STATUS_RUNNING
+    assert t.actor_name == "do_work"
+
+    # Only updates the status otherwise
+    message.encode.reset_mock()
+    Task.tasks.update_status_from_message(message, Task.STATUS_DONE, actor_name="do_work")
+    t.refresh_from_db()
+    message.encode.assert_not_called()
+    assert t.status == Task.STATUS_DONE
+    assert t.message_data == b"{}"
+
+
+def test_task_bulk_update_status_from_messages(transactional_db):
+    existing, missing = mock.Mock(), mock.Mock()
+    for message in (existing, missing):
+        message.message_id = str(uuid.uuid4())
+        message.encode.return_value = b"{}"
+        message.message_timestamp = 1500000000000
+        message.options = {}
+
+    Task.tasks.create_or_update_from_message(existing, status=Task.STATUS_ENQUEUED)
+    existing.encode.reset_mock()
+    finished_at = now()
+
+    Task.tasks.bulk_update_status_from_messages(
+        [
+            (existing, {"status": Task.STATUS_DONE, "finished_at": finished_at}),
+            (missing, {"status": Task.STATUS_RUNNING}),
+        ]
+    )
+
+    # Only the missing Task had its message encoded
+    existing.encode.assert_not_called()
+    missing.encode.assert_called_once_with()
+    assert Task.tasks.get(pk=existing.message_id).status == Task.STATUS_DONE
+    assert Task.tasks.get(pk=existing.message_id).finished_at == finished_at
+    assert Task.tasks.get(pk=missing.message_id).status == Task.STATUS_RUNNING
+
+
+@pytest.mark.parametrize(
+    "filters, index_name",
+    (
+        ({"status": Task.STATUS_DONE}, "dramatiq_task_status_updated"),
+        ({"queue_name": "default", "status": Task.STATUS_DONE}, "dramatiq_task_queue_updated"),
+        ({"actor_name": "do_work"}, "dramatiq_task_actor_updated"),
+    ),
+)
+def test_task_admin_queries_use_indexes(db, filters, index_name):
+    # Given the kind of query the admin changelist runs
+    queryset = Task.tasks.filter(**filters).order_by("-updated_at")[:100]
+
+    # Then its plan should use the matching index
+    assert index_name in queryset.explain()
+
+
+def test_task_bulk_create_or_update_only_sets_given_fields(transactional_db):
+    enqueued, failed = mock.Mock(), mock.Mock()
+    for message in (enqueued, failed):
+        message.message_id = str(uuid.uuid4())
+        message.encode.return_value = b"{}"
+        message.message_timestamp = 1500000000000
+        message.options = {}
+
+    failed.options = {"retries": 3}
+    Task.tasks.create_or_update_from_message(failed, status=Task.STATUS_ENQUEUED, retries=3)
+
+    # Updates that set different fields are written together
+    Task.tasks.bulk_create_or_update_from_messages(
+        [
+            (enqueued, {"status": Task.STATUS_ENQUEUED, "retries": 1}),
+            (failed, {"status": Task.STATUS_FAILED, "failure_reason": "RuntimeError: failed"}),
+        ]
+    )
+
+    # Fields an update didn't set are left alone
+    t = Task.tasks.get(pk=failed.message_id)
+    assert t.status == Task.STATUS_FAILED
+    assert t.retries == 3
+    assert t.failure_reason == "RuntimeError: failed"
+    assert Task.tasks.get(pk=enqueued.message_id).retries == 1
+
+
+def test_task_writes_never_move_tasks_back_in_their_lifecycle(transactional_db):
+    # Given a message that ran and a Task that's done
+    message = mock.Mock()
+    message.message_id = str(uuid.uuid4())
+    message.encode.return_value = b"{}"
+    message.message_timestamp = 1500000000000
+    message.options = {}
+    Task.tasks.create_or_update_from_message(message, status=Task.STATUS_DONE)
+
+    # When stale updates for the same attempt are written late
+    Task.tasks.create_or_update_from_message(message, status=Task.STATUS_ENQUEUED, finished_at=None)
+    Task.tasks.bulk_create_or_update_from_messages([(message, {"status": Task.STATUS_ENQUEUED})])
+    Task.tasks.update_status_from_message(message, Task.STATUS_RUNNING)
+    Task.tasks.bulk_update_status_from_messages([(message, {"status": Task.STATUS_RUNNING})])
+
+    # Then the Task should stay done
+    assert Task.tasks.get().status == Task.STATUS_DONE
+
+    # When the message is retried
+    message.options = {"retries": 1}
+    Task.tasks.bulk_create_or_update_from_messages([(message, {"status": Task.STATUS_ENQUEUED, "retries": 1})])
+
+    # Then the new attempt should replace it
+    assert Task.tasks.get().status == Task.STATUS_ENQUEUED
@@ -0,0 +1,108 @@
+from unittest import mock
+
+import dramatiq
+import pytest
+from django.db import OperationalError, transaction
+
+from django_dramatiq.models import OutboxMessage, Task
+from django_dramatiq.outbox import relay_outbox, run_relay, send_via_outbox, send_with_options_via_outbox
+
+
+def test_send_via_outbox_stores_messages_until_relayed(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def outbox_work(x):
+        pass
+
+    with mock.patch.object(broker, "enqueue", wraps=broker.enqueue) as enqueue:
+        # When messages are sent through the outbox inside a transaction
+        with transaction.atomic():
+            messages = [send_via_outbox(outbox_work, x) for x in range(3)]
+            send_with_options_via_outbox(outbox_work, args=(3,), delay=1000)
+
+        # Then they should be stored in the outbox instead of being enqueued
+        enqueue.assert_not_called()
+        assert OutboxMessage.messages.count() == 4
+
+        # When the outbox is relayed in batches
+        assert relay_outbox(batch_size=3) == 3
+        assert relay_outbox(batch_size=3) == 1
+        assert relay_outbox(batch_size=3) == 0
+
+    # Then they should be enqueued in order and removed from the outbox
+    assert [call.args[0].message_id for call in enqueue.call_args_list[:3]] == [m.message_id for m in messages]
+    assert [call.kwargs["delay"] for call in enqueue.call_args_list] == [None, None, None, 1000]
+    assert not OutboxMessage.messages.exists()
+
+    # And their Tasks should be stored
+    assert Task.tasks.filter(actor_name="outbox_work").count() == 4
+
+
+def test_send_via_outbox_drops_messages_on_rollback(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def rolled_back_outbox_work():
+        pass
+
+    # When a message is sent through the outbox inside a transaction that is rolled back
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            send_via_outbox(rolled_back_outbox_work)
+            raise RuntimeError("failed")
+
+    # Then it should never be relayed
+    assert relay_outbox() == 0
+
+
+def test_relay_outbox_keeps_messages_that_fail_to_enqueue(transactional_db, broker):
+    # Given a message in the outbox
+    @dramatiq.actor
+    def failing_outbox_work():
+        pass
+
+    send_via_outbox(failing_outbox_work)
+
+    # When enqueueing it fails
+    with mock.patch.object(broker, "enqueue", side_effect=RuntimeError("broker is down")):
+        with pytest.raises(RuntimeError):
+            relay_outbox()
+
+    # Then it should stay in the outbox
+    assert OutboxMessage.messages.count() == 1
+
+
+def test_relay_outbox_removes_messages_whose_tasks_cannot_be_written(transactional_db, broker):
+    # Given messages in the outbox
+    @dramatiq.actor
+    def untracked_outbox_work():
+        pass
+
+    for _ in range(2):
+        send_via_outbox(untracked_outbox_work)
+
+    # When they are relayed while Tasks can't be written
+    with mock.patch.object(broker, "enqueue", wraps=broker.enqueue) as enqueue:
+        with mock.patch.object(
+            Task.tasks, "bulk_create_or_update_from_messages", side_effect=OperationalError("database is down")
+        ):
+            assert relay_outbox() == 2
+            assert relay_outbox() == 0
+
+    # Then they should be enqueued and removed from the outbox exactly once
+    assert enqueue.call_count == 2
+    assert not OutboxMessage.messages.exists()
+
+
+def test_run_relay_relays_until_stopped(transactional_db, broker, settings):
+    # Given a relay that polls an empty outbox
+    settings.DRAMATIQ_OUTBOX = {"POLL_INTERVAL": 5}
+
+    # When it runs until its process is stopped
+    with mock.patch("django_dramatiq.outbox.relay_outbox", side_effect=[RuntimeError("broker is down"), 0]) as relay:
+        with mock.patch("time.sleep", side_effect=[None, SystemExit]) as sleep:
+            with pytest.raises(SystemExit):
+                run_relay()
+
+    # Then it should keep relaying after errors, and wait for new messages in between
+    assert relay.call_count == 2
+    sleep.assert_called_with(5)
@@ -0,0 +1,194 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import NotSupportedError, ProgrammingError, connection, connections
+
+from django_dramatiq.models import Task
+from django_dramatiq.partitions import (
+    create_partitions,
+    drop_partitions,
+    get_default_partition_name,
+    get_next_partition_start,
+    get_partition_name,
+    get_partition_start,
+    get_partitioning_settings,
+    list_partitions,
+    parse_partition_name,
+)
+
+requires_postgres = pytest.mark.skipif(
+    "postgres" not in settings.DATABASES, reason="DRAMATIQ_TEST_POSTGRES is not set."
+)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "interval, start, next_start",
+    (
+        ("day", utc(2024, 12, 31), utc(2025, 1, 1)),
+        ("week", utc(2024, 12, 30), utc(2025, 1, 6)),
+        ("month", utc(2024, 12, 1), utc(2025, 1, 1)),
+    ),
+)
+def test_partition_boundaries(interval, start, next_start):
+    assert get_partition_start(utc(2024, 12, 31, 13, 37), interval) == start
+    assert get_next_partition_start(start, interval) == next_start
+
+
+def test_parse_partition_name():
+    assert parse_partition_name("task", "task_p20241231") == utc(2024, 12, 31)
+    assert parse_partition_name("task", "task_default") is None
+    assert parse_partition_name("task", "task_pnope") is None
+
+
+def test_partitioning_settings(settings):
+    settings.DRAMATIQ_TASKS_PARTITIONING = {}
+    assert get_partitioning_settings() is None
+
+    settings.DRAMATIQ_TASKS_PARTITIONING = {"INTERVAL": "week"}
+    assert get_partitioning_settings() == {"INTERVAL": "week", "PREMAKE": 7}
+
+    settings.DRAMATIQ_TASKS_PARTITIONING = {"INTERVAL": "year"}
+    with pytest.raises(ValueError):
+        get_partitioning_settings()
+
+
+def make_postgres_connection(partitions=()):
+    pg_connection = mock.MagicMock(vendor="postgresql")
+    pg_connection.ops.quote_name = lambda name: f'"{name}"'
+    cursor = pg_connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(name,) for name in partitions]
+    return pg_connection, cursor
+
+
+def test_create_partitions():
+    pg_connection, cursor = make_postgres_connection()
+
+    names = create_partitions(pg_connection, Task, interval="day", count=1, today=utc(2024, 12, 31, 12))
+
+    assert names == ["django_dramatiq_task_p20241231", "django_dramatiq_task_p20250101"]
+    assert cursor.execute.call_args_list[1] == mock.call(
+        'CREATE TABLE IF NOT EXISTS "django_dramatiq_task_p20241231" PARTITION OF "django_dramatiq_task" '
+        "FOR VALUES FROM ('2024-12-31T00:00:00+00:00') TO ('2025-01-01T00:00:00+00:00')"
+    )
+
+
+def test_create_partitions_moves_rows_out_of_the_default_partition():
+    # Given a partitioned table whose default partition may hold rows
+    # for the partitions to create, one of which already exists
+    pg_connection, cursor = make_postgres_connection(["django_dramatiq_task_default", "django_dramatiq_task_p20241231"])
+
+    # When I create partitions
+    with mock.patch("django_dramatiq.partitions.transaction.atomic"):
+        names = create_partitions(pg_connection, Task, interval="day", count=1, today=utc(2024, 12, 31, 12))
+
+    # Then the missing partition should be created empty, filled with
+    # the default partition's rows in its range, and then attached
+    assert names == ["django_dramatiq_task_p20241231", "django_dramatiq_task_p20250101"]
+    assert cursor.execute.call_args_list[1:] == [
+        mock.call('CREATE TABLE "django_dramatiq_task_p20250101" (LIKE "django_dramatiq_task" INCLUDING DEFAULTS)'),
+        mock.call(
+            'WITH moved AS (DELETE FROM "django_dramatiq_task_default" WHERE created_at >= %s AND created_at < %s '
+            'RETURNING *) INSERT INTO "django_dramatiq_task_p20250101" SELECT * FROM moved',
+            [utc(2025, 1, 1), utc(2025, 1, 2)],
+        ),
+        mock.call(
+            'ALTER TABLE "django_dramatiq_task" ATTACH PARTITION "django_dramatiq_task_p20250101" '
+            "FOR VALUES FROM ('2025-01-01T00:00:00+00:00') TO ('2025-01-02T00:00:00+00:00')"
+        ),
+    ]
+
+
+def test_drop_partitions():
+    pg_connection, cursor = make_postgres_connection(
+        ["django_dramatiq_task_default", "django_dramatiq_task_p20241230", "django_dramatiq_task_p20241231"]
+    )
+
+    dropped = drop_partitions(pg_connection, Task, interval="day", before=utc(2024, 12, 31, 12))
+
+    assert dropped == ["django_dramatiq_task_p20241230"]
+    cursor.execute.assert_called_with('DROP TABLE "django_dramatiq_task_p20241230"')
+
+
+def test_partitioning_requires_postgres():
+    with pytest.raises(NotSupportedError):
+        create_partitions(connection, Task, interval="day", count=1)
+
+
+def test_partitions_command_requires_partitioning_to_be_configured(settings):
+    settings.DRAMATIQ_TASKS_PARTITIONING = {}
+    with pytest.raises(CommandError):
+        call_command("dramatiqpartitions", stdout=StringIO())
+
+
+def test_partitions_command_requires_postgres(db, settings):
+    settings.DRAMATIQ_TASKS_PARTITIONING = {"INTERVAL": "day"}
+    with pytest.raises(CommandError, match="PostgreSQL"):
+        call_command("dramatiqpartitions", stdout=StringIO())
+
+
+@requires_postgres
+@pytest.mark.django_db(databases=["default", "postgres"], transaction=True)
+def test_partitioning_on_postgres(settings):
+    pg_connection = connections["postgres"]
+    table = Task._meta.db_table
+    today = get_partition_start(datetime.now(timezone.utc), "day")
+    last_week = today - timedelta(days=7)
+
+    def count_rows(name):
+        with pg_connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {pg_connection.ops.quote_name(name)}")
+            return cursor.fetchone()[0]
+
+    # Given a Task created today and one created last week
+    for created_at in (today + timedelta(hours=1), last_week + timedelta(hours=1)):
+        Task.tasks.using("postgres").create(id=uuid.uuid4(), message_data=b"", created_at=created_at)
+
+    # When partitioning the table fails while recreating its indexes
+    settings.DRAMATIQ_TASKS_PARTITIONING = {"INTERVAL": "day", "PREMAKE": 1}
+    with (
+        mock.patch("django_dramatiq.management.commands.dramatiqpartitions.DATABASE_LABEL", "postgres"),
+        mock.patch.object(
+            type(pg_connection.schema_editor()), "_model_indexes_sql", return_value=["CREATE INDEX ON nope (id)"]
+        ),
+    ):
+        with pytest.raises(ProgrammingError):
+            call_command("dramatiqpartitions", "--setup", stdout=StringIO())
+
+    # Then the table should be left as it was
+    assert list_partitions(pg_connection, Task) == []
+    assert count_rows(table) == 2
+
+    # When the table is partitioned
+    with mock.patch("django_dramatiq.management.commands.dramatiqpartitions.DATABASE_LABEL", "postgres"):
+        call_command("dramatiqpartitions", "--setup", stdout=StringIO())
+
+    # Then the Task created last week should end up in the default partition
+    default = get_default_partition_name(table)
+    assert list_partitions(pg_connection, Task) == sorted(
+        [default, get_partition_name(table, today), get_partition_name(table, today + timedelta(days=1))]
+    )
+    assert count_rows(default) == 1
+    assert count_rows(get_partition_name(table, today)) == 1
+
+    # And the table should have its indexes back
+    with pg_connection.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+        index_names = {name for (name,) in cursor.fetchall()}
+    assert {index.name for index in Task._meta.indexes} <= index_names
+
+    # When the partition for last week is created
+    create_partitions(pg_connection, Task, interval="day", count=0, today=last_week)
+
+    # Then the Task should be moved out of the default partition
+    assert count_rows(default) == 0
+    assert count_rows(get_partition_name(table, last_week)) == 1
+    assert Task.tasks.using("postgres").count() == 2
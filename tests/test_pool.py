@@ -0,0 +1,96 @@
+import sys
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from django_dramatiq import pool
+from django_dramatiq.buffer import TaskBuffer
+from django_dramatiq.middleware import DbConnectionsMiddleware
+from django_dramatiq.stats import StatsCollector
+
+
+def test_get_pool_options_defaults_to_one_connection_per_thread():
+    # Leaving room for the TaskBuffer and StatsCollector flushers.
+    assert pool.get_pool_options({}, 8) == {"min_size": 1, "max_size": 10, "timeout": 10.0, "max_idle": 300.0}
+    assert pool.get_pool_options({"MIN_SIZE": 4, "MAX_SIZE": 2}, 8)["max_size"] == 4
+
+
+def test_configure_pools_skips_other_databases_by_default():
+    connections = mock.MagicMock()
+    connections.__iter__.return_value = iter(["default"])
+    connections.__getitem__.return_value = mock.Mock(vendor="sqlite")
+    with mock.patch.object(pool.db, "connections", connections):
+        assert pool.configure_pools({}, 8) == []
+
+
+def test_configure_pools_requires_postgres():
+    with pytest.raises(ImproperlyConfigured):
+        pool.configure_pools({"ALIASES": ["default"]}, 8)
+
+
+def test_db_connections_middleware_configures_pools(settings):
+    # Given a PostgreSQL database on psycopg 3 and Django 5.1+
+    settings_dict = {"OPTIONS": {}, "CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": False}
+    connection = mock.Mock(vendor="postgresql")
+    connections = mock.MagicMock()
+    connections.__iter__.return_value = iter(["default"])
+    connections.__getitem__.return_value = connection
+    connections.settings = {"default": settings_dict}
+    psycopg_any = SimpleNamespace(is_psycopg3=True)
+
+    # And a DbConnectionsMiddleware that pools connections
+    settings.DRAMATIQ_DB_POOL = {"MAX_IDLE": 60}
+    middleware = DbConnectionsMiddleware()
+
+    # When a worker with four threads boots
+    with (
+        mock.patch.object(pool.db, "connections", connections),
+        mock.patch.object(pool, "django", SimpleNamespace(VERSION=(5, 1))),
+        mock.patch.dict(sys.modules, {"django.db.backends.postgresql.psycopg_any": psycopg_any}),
+    ):
+        middleware.before_worker_boot(None, SimpleNamespace(worker_threads=4))
+
+        # Then the database's connections should be pooled
+        assert settings_dict == {
+            "OPTIONS": {"pool": {"min_size": 1, "max_size": 6, "timeout": 10.0, "max_idle": 60}},
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": True,
+        }
+        connection.close.assert_called_once_with()
+
+        # When the worker shuts down
+        with mock.patch.object(middleware, "_close_connections"):
+            middleware.before_worker_shutdown(None, None)
+
+        # Then the pool should be closed
+        connection.close_pool.assert_called_once_with()
+
+
+@pytest.mark.parametrize("make_flusher", (TaskBuffer, StatsCollector))
+def test_background_flushes_release_their_connections(make_flusher):
+    # Given a background thread that flushes every 10ms
+    flusher = make_flusher(flush_interval=0.01)
+    calls = mock.Mock()
+    flushed = threading.Event()
+
+    def flush(**kwargs):
+        calls.flush()
+        flushed.set()
+
+    # When it flushes
+    with (
+        mock.patch.object(flusher, "flush", side_effect=flush),
+        mock.patch("django.db.close_old_connections", calls.close_old_connections),
+    ):
+        thread = threading.Thread(target=flusher._run)
+        thread.start()
+        flushed.wait()
+        flusher.stopping.set()
+        thread.join()
+
+    # Then it should release its connections right away, rather than hold them until its next flush
+    names = [name for name, _, _ in calls.mock_calls]
+    assert names[names.index("flush") + 1] == "close_old_connections"
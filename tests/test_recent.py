@@ -0,0 +1,104 @@
+import json
+import os
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError, call_command
+from dramatiq import Message
+
+from django_dramatiq.middleware import RecentTasksMiddleware
+from django_dramatiq.models import Task
+from django_dramatiq.recent import SNAPSHOT_PREFIX, TaskRecord, read_snapshots
+
+
+def test_task_records_use_slots():
+    record = TaskRecord("id", "do_work", "default", Task.STATUS_RUNNING, 0)
+    with pytest.raises(AttributeError):
+        record.extra = 1
+
+
+def test_recent_tasks_middleware_keeps_the_last_tasks(broker, settings):
+    # Given a RecentTasksMiddleware that keeps two records
+    settings.DRAMATIQ_TASKS_RECENT = {"MAX_SIZE": 2}
+    middleware = RecentTasksMiddleware()
+
+    # When three messages are processed, one of which fails
+    messages = [Message("default", "do_work", (), {}, {}) for _ in range(3)]
+    for message in messages:
+        middleware.before_process_message(broker, message)
+    middleware.after_process_message(broker, messages[0])
+    middleware.after_process_message(broker, messages[1])
+    middleware.after_process_message(broker, messages[2], exception=RuntimeError("failed"))
+
+    # Then only the last two should be kept, with their final statuses
+    assert [(record.message_id, record.status) for record in middleware.records] == [
+        (messages[1].message_id, Task.STATUS_DONE),
+        (messages[2].message_id, Task.STATUS_FAILED),
+    ]
+    assert middleware.records[1].failure_reason == "RuntimeError: failed"
+    assert not middleware.running
+
+
+def test_recent_tasks_can_be_inspected_from_snapshots(broker, settings, tmp_path):
+    # Given a RecentTasksMiddleware that snapshots its records
+    settings.DRAMATIQ_TASKS_RECENT = {"SNAPSHOT_DIR": str(tmp_path), "SNAPSHOT_INTERVAL": 0}
+    middleware = RecentTasksMiddleware()
+
+    # When a message is processed and another one is skipped
+    done, skipped = Message("default", "do_work", (), {}, {}), Message("default", "do_other_work", (), {}, {})
+    middleware.before_process_message(broker, done)
+    middleware.after_process_message(broker, done)
+    middleware.after_skip_message(broker, skipped)
+
+    # Then a snapshot should have been written
+    (snapshot,) = read_snapshots(str(tmp_path))
+    assert [record["status"] for record in snapshot["records"]] == [Task.STATUS_DONE, Task.STATUS_SKIPPED]
+
+    # And the command should list the tasks, most recent first
+    stdout = StringIO()
+    call_command("dramatiqrecenttasks", stdout=stdout)
+    lines = stdout.getvalue().splitlines()
+    assert [line.split()[0] for line in lines] == [skipped.message_id, done.message_id]
+
+    # And filter them
+    stdout = StringIO()
+    call_command("dramatiqrecenttasks", "--actor", "do_work", "--json", stdout=stdout)
+    assert [record["message_id"] for record in json.loads(stdout.getvalue())] == [done.message_id]
+
+
+def test_recent_tasks_command_requires_a_snapshot_dir(settings):
+    settings.DRAMATIQ_TASKS_RECENT = {}
+    with pytest.raises(CommandError):
+        call_command("dramatiqrecenttasks", stdout=StringIO())
+
+
+def test_recent_tasks_snapshot_is_removed_on_shutdown(broker, settings, tmp_path):
+    # Given a RecentTasksMiddleware that has written a snapshot
+    settings.DRAMATIQ_TASKS_RECENT = {"SNAPSHOT_DIR": str(tmp_path), "SNAPSHOT_INTERVAL": 0}
+    middleware = RecentTasksMiddleware()
+    message = Message("default", "do_work", (), {}, {})
+    middleware.before_process_message(broker, message)
+    middleware.after_process_message(broker, message)
+    assert read_snapshots(str(tmp_path))
+
+    # When the worker shuts down while a message is still finishing
+    middleware.before_worker_shutdown(broker, mock.Mock())
+    middleware.before_process_message(broker, message)
+    middleware.after_process_message(broker, message)
+
+    # Then its snapshot should be gone for good
+    assert not os.listdir(tmp_path)
+
+
+def test_snapshots_of_dead_processes_are_skipped(tmp_path):
+    # Given snapshots of this process and of one that was killed
+    for pid in (os.getpid(), 2**22 + 1):
+        snapshot = {"pid": pid, "taken_at": 0, "records": []}
+        (tmp_path / f"{SNAPSHOT_PREFIX}{pid}.json").write_text(json.dumps(snapshot))
+
+    # When I read the snapshots
+    snapshots = read_snapshots(str(tmp_path))
+
+    # Then only the running process' snapshot should be listed
+    assert [snapshot["pid"] for snapshot in snapshots] == [os.getpid()]
@@ -424,3 +424,21 @@ def test_rundramatiq_can_fork(execvp_mock, settings):
             "tests.testapp3.tasks.utils.not_a_task",
         ],
     )
+
+
+@patch("os.execvp")
+def test_rundramatiq_can_fork_an_outbox_relay(execvp_mock, settings):
+    # Given an output buffer
+    buff = StringIO()
+
+    # When I call the rundramatiq command with --outbox-relay
+    call_command("rundramatiq", "--fork-function", "a", "--outbox-relay", stdout=buff)
+
+    # Then the relay should be forked along with the other functions
+    process_args = execvp_mock.call_args[0][1]
+    assert process_args[process_args.index("--fork-function") :][:4] == [
+        "--fork-function",
+        "a",
+        "--fork-function",
+        "django_dramatiq.outbox:run_relay",
+    ]
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+
+from django.urls import reverse
+from django.utils.timezone import now
+from dramatiq import Message
+
+from django_dramatiq.middleware import AdminMiddleware
+from django_dramatiq.models import Task, TaskStats
+from django_dramatiq.stats import StatsCollector, get_bucket, get_percentiles
+from django_dramatiq.tasks import delete_old_tasks
+
+
+def test_get_bucket():
+    assert get_bucket(datetime(2024, 1, 1, 12, 34, 56, 789, tzinfo=timezone.utc)) == datetime(
+        2024, 1, 1, 12, 34, tzinfo=timezone.utc
+    )
+
+
+def test_get_percentiles():
+    assert get_percentiles(range(1, 101)) == [50, 95, 99]
+    assert get_percentiles([3, 1, 2], (0, 50, 100)) == [1, 2, 3]
+    assert get_percentiles([]) == [None, None, None]
+
+
+def test_stats_collector_adds_counts_to_rollups(transactional_db):
+    # Given a stats collector
+    collector = StatsCollector(flush_interval=60)
+
+    # When a few tasks are counted and flushed, twice
+    for _ in range(2):
+        collector.add("do_work", "default", Task.STATUS_DONE, 0.5)
+        collector.add("do_work", "default", Task.STATUS_DONE, 1.5)
+        collector.add("do_work", "default", Task.STATUS_SKIPPED)
+        collector.flush()
+    collector.close()
+
+    # Then the counts should be added to the rollups
+    done = TaskStats.stats.get(status=Task.STATUS_DONE)
+    assert done.count == 4
+    assert done.total_duration == 4
+    assert done.max_duration == 1.5
+    skipped = TaskStats.stats.get(status=Task.STATUS_SKIPPED)
+    assert skipped.count == 2
+    assert skipped.max_duration is None
+
+
+def test_admin_middleware_counts_every_message(transactional_db, broker, settings):
+    # Given an AdminMiddleware that only tracks failures but collects stats
+    settings.DRAMATIQ_TASKS_TRACKING = {"FAILURES_ONLY": True}
+    settings.DRAMATIQ_TASKS_STATS = {"FLUSH_INTERVAL": 60}
+    admin_middleware = AdminMiddleware()
+
+    # When a message is enqueued, runs and succeeds
+    message = Message("default", "do_work", (), {}, {})
+    admin_middleware.after_enqueue(broker, message, None)
+    admin_middleware.before_process_message(broker, message)
+    admin_middleware.after_process_message(broker, message)
+    admin_middleware.stats.close()
+
+    # Then no Task should be stored, but the message should be counted
+    assert not Task.tasks.exists()
+    assert dict(TaskStats.stats.values_list("status", "count")) == {Task.STATUS_ENQUEUED: 1, Task.STATUS_DONE: 1}
+    assert TaskStats.stats.get(status=Task.STATUS_DONE).max_duration is not None
+    assert not admin_middleware.started
+
+
+def test_task_stats_dashboard(admin_client):
+    # Given some rollups
+    bucket = get_bucket(now())
+    for status, count in ((Task.STATUS_DONE, 3), (Task.STATUS_FAILED, 1)):
+        TaskStats.stats.create(
+            bucket=bucket,
+            actor_name="do_work",
+            queue_name="default",
+            status=status,
+            count=count,
+            total_duration=count * 2,
+            max_duration=3,
+        )
+
+    # When I view the stats changelist
+    response = admin_client.get(reverse("admin:django_dramatiq_taskstats_changelist"))
+
+    # Then it should link to the dashboard
+    dashboard_url = reverse("admin:django_dramatiq_taskstats_dashboard")
+    assert dashboard_url in response.content.decode()
+
+    # When I view the dashboard
+    response = admin_client.get(dashboard_url, {"hours": 24})
+
+    # Then the actor's stats should be summarized
+    assert response.status_code == 200
+    (row,) = response.context["rows"]
+    assert row["counts"][Task.STATUS_DONE] == 3
+    assert row["failure_rate"] == 0.25
+    assert row["avg_duration"] == 2
+
+
+def test_task_stats_dashboard_shows_timing_percentiles(admin_client):
+    # Given a couple of finished Tasks
+    enqueued_at = now() - timedelta(minutes=1)
+    for latency, runtime in ((1, 2), (3, 4)):
+        message = Message("default", "do_work", (), {}, {})
+        Task.tasks.create_or_update_from_message(
+            message,
+            status=Task.STATUS_DONE,
+            actor_name="do_work",
+            enqueued_at=enqueued_at,
+            started_at=enqueued_at + timedelta(seconds=latency),
+            finished_at=enqueued_at + timedelta(seconds=latency + runtime),
+        )
+
+    # And a retry that started after its previous attempt finished
+    Task.tasks.create_or_update_from_message(
+        Message("default", "do_work", (), {}, {}),
+        status=Task.STATUS_RUNNING,
+        actor_name="do_work",
+        enqueued_at=enqueued_at,
+        started_at=now(),
+        finished_at=enqueued_at,
+    )
+
+    # When I view the dashboard
+    response = admin_client.get(reverse("admin:django_dramatiq_taskstats_dashboard"))
+
+    # Then it should show latency and runtime percentiles per actor, without the retry
+    assert response.context["timings"] == [
+        {"actor_name": "do_work", "count": 2, "latency": [1, 3, 3], "runtime": [2, 4, 4]},
+    ]
+
+
+def test_delete_old_tasks_deletes_old_stats(transactional_db, settings):
+    # Given stats enabled and a recent and an old rollup
+    settings.DRAMATIQ_TASKS_STATS = {"RETENTION": 3600}
+    for bucket in (get_bucket(now()), get_bucket(now() - timedelta(hours=2))):
+        TaskStats.stats.create(bucket=bucket, actor_name="do_work", queue_name="default", status=Task.STATUS_DONE)
+
+    # When I delete old tasks
+    delete_old_tasks()
+
+    # Then only the recent rollup should be left
+    assert TaskStats.stats.count() == 1
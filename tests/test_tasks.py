@@ -1,7 +1,9 @@
 import uuid
 from datetime import timedelta
+from unittest import mock
 
 import pytest
+from django.db import ProgrammingError
 from django.utils.timezone import now
 
 from django_dramatiq.models import Task
@@ -24,3 +26,73 @@ def test_can_delete_old_tasks(db):
     # Then my task should be deleted
     with pytest.raises(Task.DoesNotExist):
         task.refresh_from_db()
+
+
+def test_delete_old_tasks_prunes_even_if_partitions_cannot_be_created(db, settings):
+    # Given a partitioned tasks table whose upcoming partitions can't be created
+    settings.DRAMATIQ_TASKS_PARTITIONING = {"INTERVAL": "day"}
+    create_partitions = mock.patch(
+        "django_dramatiq.tasks.create_partitions",
+        side_effect=ProgrammingError("updated partition constraint for default partition would be violated"),
+    )
+    drop_partitions = mock.patch("django_dramatiq.models.drop_partitions", return_value=[])
+
+    # And a Task that was created more than a day ago
+    task = Task(id=uuid.uuid4(), message_data=b"")
+    task.save()
+    Task.tasks.update(created_at=now() - timedelta(days=2))
+
+    # When I call the delete_old_tasks task
+    with create_partitions, drop_partitions:
+        delete_old_tasks()
+
+    # Then my task should still be deleted
+    assert not Task.tasks.exists()
+
+
+def test_can_delete_old_tasks_in_batches(db):
+    # Given five Tasks that were created more than a day ago
+    for _ in range(5):
+        Task(id=uuid.uuid4(), message_data=b"").save()
+    Task.tasks.update(created_at=now() - timedelta(days=2))
+
+    # And a Task that was just created
+    recent_task = Task(id=uuid.uuid4(), message_data=b"")
+    recent_task.save()
+
+    # When I delete old tasks two at a time
+    deleted = Task.tasks.delete_old_tasks(86400, batch_size=2, batch_delay=0)
+
+    # Then only the old Tasks should be deleted
+    assert deleted == 5
+    assert list(Task.tasks.all()) == [recent_task]
+
+
+def test_delete_old_tasks_applies_retention_rules(db, settings):
+    # Given retention rules that keep failed Tasks longer than the
+    # rest, except for one actor
+    settings.DRAMATIQ_TASKS_RETENTION = {
+        "STATUSES": {Task.STATUS_DONE: 3600, Task.STATUS_FAILED: 30 * 86400},
+        "ACTORS": {"noisy": 3600},
+    }
+
+    # And Tasks that were created two hours ago
+    def make_task(status, actor_name):
+        task = Task(id=uuid.uuid4(), message_data=b"", status=status, actor_name=actor_name)
+        task.save()
+        return task
+
+    done = make_task(Task.STATUS_DONE, "quiet")
+    failed = make_task(Task.STATUS_FAILED, "quiet")
+    noisy_failed = make_task(Task.STATUS_FAILED, "noisy")
+    enqueued = make_task(Task.STATUS_ENQUEUED, "quiet")
+    Task.tasks.update(created_at=now() - timedelta(hours=2))
+
+    # When I delete old tasks
+    deleted = Task.tasks.delete_old_tasks(86400, batch_delay=0)
+
+    # Then only the Tasks whose rule has expired should be deleted
+    assert deleted == 2
+    remaining_ids = set(Task.tasks.values_list("id", flat=True))
+    assert remaining_ids == {failed.id, enqueued.id}
+    assert done.id not in remaining_ids and noisy_failed.id not in remaining_ids
@@ -0,0 +1,62 @@
+from django_dramatiq.tracebacks import TRUNCATED_MARKER, TracebackCapture, get_fingerprint
+
+
+def fail(message):
+    raise RuntimeError(message)
+
+
+def catch(message="failed"):
+    try:
+        fail(message)
+    except RuntimeError as e:
+        return e
+
+
+def test_fingerprints_ignore_exception_messages():
+    assert get_fingerprint(catch("first")) == get_fingerprint(catch("second"))
+    assert get_fingerprint(catch()) != get_fingerprint(ValueError("failed"))
+
+
+def test_traceback_capture_formats_tracebacks_outside_of_except_blocks():
+    # Given an exception that's no longer being handled
+    exception = catch()
+
+    # When I capture it
+    fingerprint, formatted = TracebackCapture().capture(exception)
+
+    # Then its traceback should be formatted from the exception itself
+    assert fingerprint == get_fingerprint(exception)
+    assert formatted.startswith("Traceback (most recent call last):")
+    assert "in fail" in formatted
+    assert formatted.endswith("RuntimeError: failed\n")
+
+
+def test_traceback_capture_deduplicates_by_fingerprint():
+    # Given a traceback capture
+    capture = TracebackCapture(dedup_ttl=60)
+
+    # When the same failure is captured twice
+    first_fingerprint, first = capture.capture(catch("first"))
+    second_fingerprint, second = capture.capture(catch("second"))
+
+    # Then only the first one should be formatted
+    assert first_fingerprint == second_fingerprint
+    assert first is not None
+    assert second is None
+
+
+def test_traceback_capture_limits_tracebacks():
+    # Given a traceback capture that keeps one frame and 20 characters
+    capture = TracebackCapture(max_frames=1, max_size=20)
+
+    # When a failure is captured
+    _, formatted = capture.capture(catch())
+
+    # Then only the end of the traceback should be kept
+    assert formatted == TRUNCATED_MARKER + "RuntimeError: failed\n"[-20:]
+
+
+def test_traceback_capture_can_be_disabled():
+    fingerprint, formatted = TracebackCapture(enabled=False).capture(catch())
+    assert fingerprint
+    assert formatted is None
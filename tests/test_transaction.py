@@ -0,0 +1,77 @@
+from unittest import mock
+
+import dramatiq
+from django.db import transaction
+
+from django_dramatiq.transaction import enqueue_on_commit, send_on_commit, send_with_options_on_commit
+
+
+def test_send_on_commit_enqueues_messages_in_one_batch_on_commit(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def batched_work(x):
+        pass
+
+    with mock.patch.object(broker, "enqueue", wraps=broker.enqueue) as enqueue:
+        with transaction.atomic():
+            # When messages are sent inside a transaction
+            messages = [send_on_commit(batched_work, x) for x in range(3)]
+            send_with_options_on_commit(batched_work, args=(3,), delay=1000)
+
+            # Then nothing should be enqueued until it commits
+            enqueue.assert_not_called()
+
+            # And a single on_commit callback should hold them
+            assert len(transaction.get_connection().run_on_commit) == 1
+
+        # Then they should be enqueued in order once it commits
+        assert [call.args[0].args for call in enqueue.call_args_list] == [(0,), (1,), (2,), (3,)]
+        assert [call.args[0] for call in enqueue.call_args_list[:3]] == messages
+        assert enqueue.call_args_list[3].kwargs == {"delay": 1000}
+
+
+def test_send_on_commit_drops_messages_on_rollback(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def rolled_back_work(x):
+        pass
+
+    with mock.patch.object(broker, "enqueue") as enqueue:
+        # When messages are sent inside a transaction that is rolled back
+        try:
+            with transaction.atomic():
+                send_on_commit(rolled_back_work, 1)
+                raise RuntimeError("failed")
+        except RuntimeError:
+            pass
+
+        # Then they should never be enqueued
+        enqueue.assert_not_called()
+
+        # When a message is sent inside a savepoint that is rolled back
+        with transaction.atomic():
+            send_on_commit(rolled_back_work, 1)
+            try:
+                with transaction.atomic():
+                    send_on_commit(rolled_back_work, 2)
+                    raise RuntimeError("failed")
+            except RuntimeError:
+                pass
+            send_on_commit(rolled_back_work, 3)
+
+        # Then only the messages outside of it should be enqueued
+        assert [call.args[0].args for call in enqueue.call_args_list] == [(1,), (3,)]
+
+
+def test_enqueue_on_commit_enqueues_immediately_outside_transactions(transactional_db, broker):
+    # Given an actor
+    @dramatiq.actor
+    def immediate_work():
+        pass
+
+    # When a message is enqueued outside of a transaction
+    with mock.patch.object(broker, "enqueue") as enqueue:
+        message = enqueue_on_commit(immediate_work.message())
+
+    # Then it should be enqueued right away
+    enqueue.assert_called_once_with(message, delay=None)